@@ -0,0 +1,157 @@
+"""
+Admin routes
+On-demand CPU and allocation profiling, gallery snapshots and restore
+"""
+
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import PlainTextResponse
+
+from app.api import face_routes
+from app.core import profiling
+from app.core.auth import require_admin
+from app.core.config import settings
+from app.services.face_service import FaceRecognitionService
+from app.services.snapshot import SnapshotError
+
+router = APIRouter()
+
+# Functions allocation growth is attributed to
+MEMORY_TARGETS = {
+    "_decode_image": FaceRecognitionService._decode_image,
+    "_decode_image_bytes": FaceRecognitionService._decode_image_bytes,
+    "match_face": FaceRecognitionService.match_face,
+    "validate_file_size": face_routes.validate_file_size,
+    "iter_multipart_images": face_routes.iter_multipart_images,
+    "iter_ndjson_images": face_routes.iter_ndjson_images,
+}
+
+
+@router.post("/admin/profile/cpu", response_class=PlainTextResponse)
+async def profile_cpu(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(10.0, ge=1, le=1000),
+    api_key: str = Depends(require_admin)  # Requires admin authentication
+):
+    """
+    Sample busy thread stacks for `seconds` and return collapsed stacks
+    
+    Output is one `frame;frame;... count` line per stack, usable with
+    flamegraph.pl or speedscope. Threads idling in the event loop's
+    selector, lock/queue waits or an empty worker pool are left out and
+    counted in `X-Profile-Idle-Stacks`. Only one profile runs at a time.
+    
+    🔐 Requires admin API key authentication
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be <= {settings.PROFILE_MAX_SECONDS}")
+    
+    try:
+        profiling.acquire("cpu")
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    sampler = profiling.CpuSampler(interval=interval_ms / 1000)
+    try:
+        sampler.start()
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+        profiling.release()
+    
+    return PlainTextResponse(
+        sampler.collapsed(),
+        headers={
+            "X-Profile-Samples": str(sampler.samples),
+            "X-Profile-Idle-Stacks": str(sampler.idle),
+        },
+    )
+
+
+@router.post("/admin/profile/memory")
+async def profile_memory(
+    seconds: float = Query(10.0, gt=0),
+    top: int = Query(10, ge=1, le=100),
+    api_key: str = Depends(require_admin)  # Requires admin authentication
+):
+    """
+    Trace allocations for `seconds` and report growth per hot-path function
+    
+    Net allocation growth is attributed to image decoding, matching and
+    upload handling, with the top allocation sites for each;
+    `peak_traced_bytes` covers transient buffers. tracemalloc is stopped
+    again afterwards unless it was already running.
+    
+    🔐 Requires admin API key authentication
+    """
+    if seconds > settings.PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be <= {settings.PROFILE_MAX_SECONDS}")
+    
+    try:
+        profiling.acquire("memory")
+    except profiling.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    started = profiling.start_tracing()
+    try:
+        # Snapshots and the diff walk every traced block; keep them off the loop
+        before = await asyncio.to_thread(profiling.take_snapshot)
+        await asyncio.sleep(seconds)
+        after = await asyncio.to_thread(profiling.take_snapshot)
+        peak = profiling.peak_traced_memory()
+    finally:
+        if started:
+            profiling.stop_tracing()
+        profiling.release()
+    
+    functions = await asyncio.to_thread(
+        profiling.allocation_diff, before, after, MEMORY_TARGETS, top,
+    )
+    return {
+        "seconds": seconds,
+        "peak_traced_bytes": peak,
+        "functions": functions,
+    }
+
+
+@router.post("/admin/snapshot")
+async def create_snapshot(
+    incremental: bool = Query(False),
+    api_key: str = Depends(require_admin)  # Requires admin authentication
+):
+    """
+    Write the gallery to a checksummed snapshot file in SNAPSHOT_PATH
+    
+    With `incremental=true` only users changed since the last snapshot
+    written or restored by this process are stored; the response `kind`
+    is `full` when there is no such base yet.
+    
+    🔐 Requires admin API key authentication
+    """
+    try:
+        return await face_routes.face_service.create_snapshot(incremental=incremental)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Snapshot failed: {str(e)}")
+
+
+@router.post("/admin/restore")
+async def restore_snapshot(
+    name: Optional[str] = Query(None, description="Snapshot file to restore up to (default: latest chain)"),
+    api_key: str = Depends(require_admin)  # Requires admin authentication
+):
+    """
+    Replace the in-memory gallery with a snapshot chain
+    
+    Restores the latest full snapshot plus its incrementals, or the chain
+    ending at `name`. Pickle files are rewritten in the background.
+    
+    🔐 Requires admin API key authentication
+    """
+    try:
+        return await face_routes.face_service.restore_snapshot(name)
+    except (SnapshotError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Restore failed: {str(e)}")
@@ -3,13 +3,19 @@ Face Recognition API Routes
 With authentication for sensitive endpoints
 """
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from multipart.exceptions import FormParserError, MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import ClientDisconnect
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 import base64
+import json
 
 from app.services.face_service import FaceRecognitionService
 from app.core.auth import verify_api_key, require_admin
+from app.core.config import settings
 
 router = APIRouter()
 face_service = FaceRecognitionService()
@@ -17,6 +23,15 @@ face_service = FaceRecognitionService()
 # Maximum file size: 10MB
 MAX_FILE_SIZE = 10 * 1024 * 1024
 
+# Maximum NDJSON line: a base64 encoded MAX_FILE_SIZE image plus JSON overhead
+MAX_NDJSON_LINE = MAX_FILE_SIZE * 4 // 3 + 4096
+
+# Users per chunk when streaming the user listing as NDJSON
+USER_STREAM_CHUNK = 500
+
+# Endpoints counted as queued recognition work for deadline profile selection
+RECOGNITION_PATHS = ("/encode", "/encode-file", "/match", "/match-file", "/train")
+
 
 # ============ Request/Response Models ============
 
@@ -24,6 +39,9 @@ class FaceEncodeRequest(BaseModel):
     """Request to encode a face from base64 image"""
     image_base64: str
     user_id: str
+    profile: Optional[str] = None  # Recognition profile (fast, balanced, accurate)
+    deadline_ms: Optional[float] = None  # Latency budget; may downgrade the profile
+    scope: Optional[str] = None  # Grouping for filtered listing (e.g. branch or class)
 
 
 class FaceEncodeResponse(BaseModel):
@@ -32,12 +50,16 @@ class FaceEncodeResponse(BaseModel):
     user_id: str
     encoding_id: Optional[str] = None
     face_count: int = 0
+    reason: Optional[str] = None  # Rejection reason code
+    profile: Optional[str] = None  # Recognition profile used
     message: str
 
 
 class FaceMatchRequest(BaseModel):
     """Request to match a face against database"""
     image_base64: str
+    profile: Optional[str] = None  # Recognition profile (fast, balanced, accurate)
+    deadline_ms: Optional[float] = None  # Latency budget; may downgrade the profile
 
 
 class FaceMatchResult(BaseModel):
@@ -52,6 +74,8 @@ class FaceMatchResponse(BaseModel):
     success: bool
     matches: List[FaceMatchResult]
     best_match: Optional[FaceMatchResult] = None
+    reason: Optional[str] = None  # Rejection reason code
+    profile: Optional[str] = None  # Recognition profile used
     message: str
 
 
@@ -59,6 +83,8 @@ class TrainRequest(BaseModel):
     """Request to train model with images"""
     user_id: str
     images_base64: List[str]
+    profile: Optional[str] = None  # Recognition profile for enrollment
+    scope: Optional[str] = None  # Grouping for filtered listing (e.g. branch or class)
 
 
 class TrainResponse(BaseModel):
@@ -71,6 +97,15 @@ class TrainResponse(BaseModel):
 
 # ============ Helper Functions ============
 
+def require_writable_node():
+    """Reject gallery writes on a replication follower; the leader's feed would undo them"""
+    if settings.REPLICATION_LEADER_URL:
+        raise HTTPException(
+            status_code=409,
+            detail="This node is a read-only replication follower; send enrollments to the leader",
+        )
+
+
 async def validate_file_size(file: UploadFile) -> bytes:
     """Read file with size validation to prevent DoS"""
     contents = b""
@@ -96,9 +131,145 @@ async def validate_file_size(file: UploadFile) -> bytes:
     return contents
 
 
+class RequestStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body is produced while the request body is
+    still being read. The stock response listens for client disconnects
+    by calling receive(), which would swallow request body chunks; here
+    the request stream itself raises ClientDisconnect instead.
+    """
+    
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+async def iter_ndjson_images(request: Request) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream batch items from an NDJSON body, one {"id", "image_base64"}
+    object per line, without buffering the whole request
+    """
+    buffer = bytearray()
+    index = 0
+    skipping = False  # Discarding the rest of an oversized line
+    
+    def parse(line: bytes, index: int) -> Dict[str, Any]:
+        try:
+            data = json.loads(line)
+            return {"index": index, "id": data.get("id"), "image": data["image_base64"]}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return {"index": index, "error": "Each line must be a JSON object with image_base64"}
+    
+    async for chunk in request.stream():
+        buffer.extend(chunk)
+        while True:
+            newline = buffer.find(b"\n")
+            if newline < 0:
+                break
+            line = bytes(buffer[:newline])
+            del buffer[:newline + 1]
+            if skipping:
+                skipping = False
+                continue
+            if line.strip():
+                yield parse(line, index)
+                index += 1
+        
+        if len(buffer) > MAX_NDJSON_LINE:
+            if not skipping:
+                yield {"index": index, "error": f"Image too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB"}
+                index += 1
+                skipping = True
+            buffer.clear()
+    
+    if buffer.strip() and not skipping:
+        yield parse(bytes(buffer), index)
+
+
+def multipart_boundary(request: Request) -> bytes:
+    """Boundary of a multipart request; checked before any response is sent"""
+    _, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Missing multipart boundary")
+    return boundary
+
+
+async def iter_multipart_images(request: Request, boundary: bytes) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream batch items from a multipart/form-data body, one image per part,
+    yielding each part as soon as it has been received. Raises
+    MultipartParseError for malformed or truncated bodies.
+    """
+    completed: List[Dict[str, Any]] = []
+    part: Dict[str, Any] = {}
+    header = {"field": b"", "value": b""}
+    next_index = [0]
+    ended = [False]
+    
+    def on_part_begin():
+        part.clear()
+        part.update({"index": next_index[0], "data": bytearray(), "too_large": False})
+        next_index[0] += 1
+    
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+    
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+    
+    def on_header_end():
+        if header["field"].lower() == b"content-disposition":
+            _, options = parse_options_header(header["value"])
+            name = options.get(b"filename") or options.get(b"name") or b""
+            part["id"] = name.decode("utf-8", errors="replace")
+        header["field"] = header["value"] = b""
+    
+    def on_part_data(data, start, end):
+        if part["too_large"]:
+            return
+        if len(part["data"]) + (end - start) > MAX_FILE_SIZE:
+            part["too_large"] = True
+            part["data"] = bytearray()
+            return
+        part["data"] += data[start:end]
+    
+    def on_part_end():
+        item = {"index": part["index"], "id": part.get("id")}
+        if part["too_large"]:
+            item["error"] = f"File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB"
+        else:
+            item["image"] = bytes(part["data"])
+        completed.append(item)
+    
+    def on_end():
+        ended[0] = True
+    
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_end": on_end,
+    })
+    
+    async for chunk in request.stream():
+        parser.write(chunk)
+        while completed:
+            yield completed.pop(0)
+    parser.finalize()
+    while completed:
+        yield completed.pop(0)
+    if not ended[0]:
+        raise MultipartParseError("Multipart body ended before the closing boundary")
+
+
 # ============ API Endpoints ============
 
-@router.post("/encode", response_model=FaceEncodeResponse)
+@router.post("/encode", response_model=FaceEncodeResponse, dependencies=[Depends(require_writable_node)])
 async def encode_face(
     request: FaceEncodeRequest,
     api_key: str = Depends(verify_api_key)  # Requires authentication
@@ -108,6 +279,9 @@ async def encode_face(
     
     - **image_base64**: Base64 encoded image (JPEG/PNG)
     - **user_id**: Strapi user ID to associate with face
+    - **profile**: Optional recognition profile (defaults to ENROLL_PROFILE)
+    - **deadline_ms**: Optional latency budget
+    - **scope**: Optional grouping stored with the user for `/users?scope=`
     
     🔐 Requires API key authentication
     """
@@ -115,6 +289,9 @@ async def encode_face(
         result = await face_service.encode_face(
             image_base64=request.image_base64,
             user_id=request.user_id,
+            profile=request.profile,
+            deadline_ms=request.deadline_ms,
+            scope=request.scope,
         )
         return result
     except ValueError as e:
@@ -123,10 +300,13 @@ async def encode_face(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/encode-file", response_model=FaceEncodeResponse)
+@router.post("/encode-file", response_model=FaceEncodeResponse, dependencies=[Depends(require_writable_node)])
 async def encode_face_file(
     user_id: str,
     file: UploadFile = File(...),
+    profile: Optional[str] = None,
+    deadline_ms: Optional[float] = None,
+    scope: Optional[str] = None,
     api_key: str = Depends(verify_api_key)  # Requires authentication
 ):
     """
@@ -134,6 +314,8 @@ async def encode_face_file(
     
     - **user_id**: Strapi user ID to associate with face
     - **file**: Image file (JPEG/PNG, max 10MB)
+    - **profile** / **deadline_ms**: Optional recognition profile and latency budget
+    - **scope**: Optional grouping stored with the user for `/users?scope=`
     
     🔐 Requires API key authentication
     """
@@ -145,6 +327,9 @@ async def encode_face_file(
         result = await face_service.encode_face(
             image_base64=image_base64,
             user_id=user_id,
+            profile=profile,
+            deadline_ms=deadline_ms,
+            scope=scope,
         )
         return result
     except ValueError as e:
@@ -161,6 +346,8 @@ async def match_face(request: FaceMatchRequest):
     Match a face against all stored encodings
     
     - **image_base64**: Base64 encoded image to match
+    - **profile**: Optional recognition profile (defaults to MATCH_PROFILE)
+    - **deadline_ms**: Optional latency budget, e.g. 200 for kiosks
     
     Returns list of matching users sorted by confidence
     
@@ -169,17 +356,27 @@ async def match_face(request: FaceMatchRequest):
     try:
         result = await face_service.match_face(
             image_base64=request.image_base64,
+            profile=request.profile,
+            deadline_ms=request.deadline_ms,
         )
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/match-file", response_model=FaceMatchResponse)
-async def match_face_file(file: UploadFile = File(...)):
+async def match_face_file(
+    file: UploadFile = File(...),
+    profile: Optional[str] = None,
+    deadline_ms: Optional[float] = None,
+):
     """
     Match an uploaded face image against database
     
+    - **profile** / **deadline_ms**: Optional recognition profile and latency budget
+    
     ℹ️ No authentication required for matching
     """
     try:
@@ -189,15 +386,19 @@ async def match_face_file(file: UploadFile = File(...)):
         
         result = await face_service.match_face(
             image_base64=image_base64,
+            profile=profile,
+            deadline_ms=deadline_ms,
         )
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/train", response_model=TrainResponse)
+@router.post("/train", response_model=TrainResponse, dependencies=[Depends(require_writable_node)])
 async def train_user(
     request: TrainRequest,
     api_key: str = Depends(require_admin)  # Requires admin authentication
@@ -214,6 +415,8 @@ async def train_user(
         result = await face_service.train_user(
             user_id=request.user_id,
             images_base64=request.images_base64,
+            profile=request.profile,
+            scope=request.scope,
         )
         return result
     except ValueError as e:
@@ -222,7 +425,7 @@ async def train_user(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.delete("/user/{user_id}")
+@router.delete("/user/{user_id}", dependencies=[Depends(require_writable_node)])
 async def delete_user_encodings(
     user_id: str,
     api_key: str = Depends(require_admin)  # Requires admin authentication
@@ -243,15 +446,132 @@ async def delete_user_encodings(
 
 @router.get("/users")
 async def list_enrolled_users(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    cursor: Optional[str] = None,
+    updated_since: Optional[str] = Query(None, description="ISO 8601 timestamp"),
+    scope: Optional[str] = None,
+    min_encodings: int = Query(0, ge=0),
+    format: str = Query("json", description="json or ndjson"),
     api_key: str = Depends(verify_api_key)  # Requires authentication
 ):
     """
-    List all users with face encodings
+    List users with face encodings
+    
+    - **limit**: Page size (default: all matching users)
+    - **cursor**: `next_cursor` from the previous page
+    - **updated_since**: Only users updated at or after this time, oldest first
+    - **scope**: Only users enrolled with this scope
+    - **min_encodings**: Only users with at least this many encodings
+    - **format**: `ndjson` (or `Accept: application/x-ndjson`) streams one
+      user per line; the next page cursor is then in `X-Next-Cursor`
     
     🔐 Requires API key authentication
     """
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be json or ndjson")
+    
+    try:
+        user_ids, next_cursor = face_service.page_enrolled_users(
+            limit=limit,
+            cursor=cursor,
+            updated_since=updated_since,
+            scope=scope,
+            min_encodings=min_encodings,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    if format == "ndjson" or "application/x-ndjson" in request.headers.get("accept", ""):
+        async def stream():
+            lines = face_service.iter_enrolled_user_json(user_ids)
+            while True:
+                chunk = [line for _, line in zip(range(USER_STREAM_CHUNK), lines)]
+                if not chunk:
+                    break
+                yield b"\n".join(chunk) + b"\n"
+        
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+        return StreamingResponse(stream(), media_type="application/x-ndjson", headers=headers)
+    
+    # Users are pre-serialized by the index; splice them into the body directly
+    users = list(face_service.iter_enrolled_user_json(user_ids))
+    body = b'{"users":[%s],"count":%d,"next_cursor":%s}' % (
+        b",".join(users), len(users), json.dumps(next_cursor).encode("utf-8"),
+    )
+    return Response(body, media_type="application/json")
+
+
+@router.get("/changes")
+async def get_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    api_key: str = Depends(require_admin)  # Requires admin authentication
+):
+    """
+    Gallery change feed for replication
+    
+    - **since**: Return changes after this version (0 for a full sync)
+    - **limit**: Maximum changes per page
+    
+    Returns the leader epoch, the version to pass as the next `since`,
+    and `has_more` when further pages are pending.
+    
+    🔐 Requires admin API key authentication
+    """
     try:
-        users = await face_service.list_enrolled_users()
-        return {"users": users, "count": len(users)}
+        return face_service.get_changes(since=since, limit=limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/match-batch")
+async def match_face_batch(
+    request: Request,
+    profile: Optional[str] = None,
+    deadline_ms: Optional[float] = None,
+    api_key: str = Depends(verify_api_key)  # Requires authentication
+):
+    """
+    Match many images in one request, streaming results as NDJSON
+    
+    Body is either:
+    - **multipart/form-data**: one image file per part
+    - **application/x-ndjson**: one `{"id": ..., "image_base64": ...}` per line
+    
+    Each output line has the input `index`, its `id` (NDJSON id or
+    multipart filename) and the same fields as `/match`. Results arrive in
+    completion order; a final line with `done: true` summarises the batch
+    (with `success: false` if the body could not be read to the end).
+    
+    🔐 Requires API key authentication
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        items = iter_multipart_images(request, multipart_boundary(request))
+    elif content_type.startswith(("application/x-ndjson", "application/jsonl", "application/ndjson")):
+        items = iter_ndjson_images(request)
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail="Use multipart/form-data or application/x-ndjson",
+        )
+    
+    try:
+        results = face_service.match_batch(items, profile=profile, deadline_ms=deadline_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    async def stream():
+        # Headers are already sent, so input errors end the stream with a failed summary
+        try:
+            async for result in results:
+                yield json.dumps(result) + "\n"
+        except FormParserError as e:
+            yield json.dumps({"done": True, "success": False, "message": f"Malformed multipart body: {e}"}) + "\n"
+        except ClientDisconnect:
+            yield json.dumps({"done": True, "success": False, "message": "Client disconnected"}) + "\n"
+    
+    return RequestStreamingResponse(stream(), media_type="application/x-ndjson")
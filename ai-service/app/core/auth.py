@@ -17,6 +17,9 @@ API_KEY = os.environ.get("AI_SERVICE_API_KEY", "")
 # API Key header security scheme
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
+# Dev-mode warning is printed once, not on every request
+_dev_mode_warned = False
+
 
 async def verify_api_key(api_key: Optional[str] = Security(api_key_header)) -> str:
     """
@@ -25,9 +28,13 @@ async def verify_api_key(api_key: Optional[str] = Security(api_key_header)) -> s
     Raises HTTPException 401 if key is missing or invalid.
     Returns the validated API key.
     """
+    global _dev_mode_warned
+    
     if not API_KEY:
         # If no API key is configured, allow all requests (dev mode warning)
-        print("⚠️  Warning: AI_SERVICE_API_KEY not set. Authentication disabled.")
+        if not _dev_mode_warned:
+            print("⚠️  Warning: AI_SERVICE_API_KEY not set. Authentication disabled.")
+            _dev_mode_warned = True
         return "dev-mode"
     
     if not api_key:
@@ -3,7 +3,7 @@ Application configuration settings
 """
 
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Any, Dict, Optional
 
 
 class Settings(BaseSettings):
@@ -26,10 +26,52 @@ class Settings(BaseSettings):
     MIN_CONFIDENCE_SCORE: float = 0.7
     MAX_FACES_PER_IMAGE: int = 10
     
+    # Face Quality Gate (checked before encoding)
+    QUALITY_GATE_ENABLED: bool = True
+    MIN_FACE_SIZE: int = 80  # Shorter side of face box, pixels
+    MIN_BLUR_SCORE: float = 60.0  # Laplacian variance; lower = blurrier
+    MIN_BRIGHTNESS: float = 40.0  # Mean luma 0-255
+    MAX_BRIGHTNESS: float = 220.0
+    MAX_POSE_YAW: float = 0.35  # Nose offset / eye distance
+    MAX_POSE_ROLL: float = 25.0  # Degrees
+    
+    # Recognition Profiles (speed/accuracy trade-off)
+    # upsample: detector upsampling passes; model: "hog" or "cnn"
+    # landmark_model: "small" (5-point) or "large" (68-point)
+    # num_jitters: re-sampled encodings averaged per face
+    # estimated_ms: latency estimate used until real timings are observed
+    RECOGNITION_PROFILES: Dict[str, Dict[str, Any]] = {
+        "fast": {"upsample": 0, "model": "hog", "landmark_model": "small", "num_jitters": 1, "estimated_ms": 80},
+        "balanced": {"upsample": 1, "model": "hog", "landmark_model": "large", "num_jitters": 1, "estimated_ms": 250},
+        "accurate": {"upsample": 2, "model": "hog", "landmark_model": "large", "num_jitters": 10, "estimated_ms": 1500},
+    }
+    MATCH_PROFILE: str = "balanced"
+    ENROLL_PROFILE: str = "balanced"
+    
+    # Batch Matching
+    BATCH_WORKERS: int = 4  # Threads decoding/encoding batch images
+    BATCH_MAX_IN_FLIGHT: int = 8  # Images held in memory at once
+    BATCH_MAX_IMAGES: int = 1000  # Per request
+    BATCH_MATCH_WINDOW_MS: float = 5.0  # Max wait to fill a gallery search micro-batch
+    
+    # Profiling (admin endpoints)
+    PROFILE_MAX_SECONDS: float = 60.0
+    
     # Storage Paths
     FACE_ENCODINGS_PATH: str = "./data/encodings"
     TEMP_UPLOAD_PATH: str = "./data/temp"
     
+    # Gallery Snapshots
+    SNAPSHOT_PATH: str = "./data/snapshots"
+    SNAPSHOT_COMPRESSION_LEVEL: int = 1  # zlib level; 1 favours write speed
+    SNAPSHOT_RESTORE_ON_STARTUP: bool = False  # Restore when FACE_ENCODINGS_PATH is empty
+    
+    # Replication (follower mode when REPLICATION_LEADER_URL is set)
+    REPLICATION_LEADER_URL: Optional[str] = None
+    REPLICATION_API_KEY: Optional[str] = None  # Leader's AI_SERVICE_API_KEY
+    REPLICATION_POLL_INTERVAL: float = 2.0  # Seconds
+    REPLICATION_PAGE_SIZE: int = 500
+    
     class Config:
         env_file = ".env"
         case_sensitive = True
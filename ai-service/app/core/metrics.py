@@ -0,0 +1,239 @@
+"""
+Lightweight in-process metrics
+Stage latency histograms and gauges rendered in Prometheus text format,
+plus per-request stage timings for the Server-Timing header
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Latency buckets in seconds (1ms .. 10s)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Stage timings collected for the current request (None outside a request)
+_request_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+class Histogram:
+    """Cumulative histogram with a single `stage` label"""
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # stage -> (bucket counts, sum, count)
+        self._series: Dict[str, Tuple[List[int], float, int]] = {}
+
+    def observe(self, stage: str, value: float):
+        with self._lock:
+            counts, total, count = self._series.get(stage, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._series[stage] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            series = {stage: (list(c), s, n) for stage, (c, s, n) in self._series.items()}
+        for stage in sorted(series):
+            counts, total, count = series[stage]
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{stage="{stage}",le="{bound}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{self.name}_count{{stage="{stage}"}} {count}')
+        return lines
+
+
+class Counter:
+    """Monotonic counter with a single label"""
+
+    def __init__(self, name: str, description: str, label: str):
+        self.name = name
+        self.description = description
+        self.label = label
+        self._lock = threading.Lock()
+        self._values: Dict[str, int] = {}
+
+    def inc(self, label_value: str, amount: int = 1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self._lock:
+            values = dict(self._values)
+        for label_value in sorted(values):
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {values[label_value]}')
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+
+    def __init__(self, name: str, description: str, callback: Callable[[], float]):
+        self.name = name
+        self.description = description
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        try:
+            value = float(self.callback())
+        except Exception:
+            return []
+        return [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {value}",
+        ]
+
+
+class MetricsRegistry:
+    """Holds the stage histogram, counters and registered gauges"""
+
+    def __init__(self):
+        self.stage_latency = Histogram(
+            "face_stage_duration_seconds",
+            "Time spent in each face recognition pipeline stage",
+        )
+        self.quality_rejections = Counter(
+            "face_quality_rejections_total",
+            "Frames rejected by the pre-encoding quality gate",
+            "reason",
+        )
+        self._gauges: Dict[str, Gauge] = {}
+        # Requests currently being handled (maintained by ServerTimingMiddleware)
+        self.inflight_requests = 0
+        self.register_gauge(
+            "http_requests_in_flight",
+            "HTTP requests currently being handled",
+            lambda: self.inflight_requests,
+        )
+        # Subset of those hitting face recognition endpoints
+        self.inflight_recognition = 0
+        self.register_gauge(
+            "face_recognition_requests_in_flight",
+            "Face recognition requests currently queued or being handled",
+            lambda: self.inflight_recognition,
+        )
+
+    def register_gauge(self, name: str, description: str, callback: Callable[[], float]):
+        """Register (or replace) a gauge evaluated on every scrape"""
+        self._gauges[name] = Gauge(name, description, callback)
+
+    def observe_stage(self, stage: str, duration: float):
+        """Record a stage duration in the histogram and the current request timings"""
+        self.stage_latency.observe(stage, duration)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((stage, duration))
+
+    @contextmanager
+    def timed(self, stage: str) -> Iterator[None]:
+        """Time the enclosed block as a pipeline stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format"""
+        lines = self.stage_latency.render()
+        lines.extend(self.quality_rejections.render())
+        for name in sorted(self._gauges):
+            lines.extend(self._gauges[name].render())
+        return "\n".join(lines) + "\n"
+
+
+def start_request_timing() -> List[Tuple[str, float]]:
+    """Begin collecting stage timings for the current request"""
+    timings: List[Tuple[str, float]] = []
+    _request_timings.set(timings)
+    return timings
+
+
+def format_server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    """Format stage timings as a Server-Timing header value (durations in ms)"""
+    entries = [f"{stage};dur={duration * 1000:.2f}" for stage, duration in timings]
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware adding a Server-Timing header with the stage timings
+    recorded so far, and tracking in-flight requests. Requests to
+    `recognition_paths` are also counted separately as recognition load.
+    Implemented at the ASGI level so streamed request and response bodies
+    pass through untouched.
+    """
+
+    def __init__(self, app, recognition_paths: Iterable[str] = ()):
+        self.app = app
+        self.recognition_paths = frozenset(recognition_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        timings = start_request_timing()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                value = format_server_timing(timings, time.perf_counter() - start)
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", value.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        recognition = scope.get("path") in self.recognition_paths
+        metrics.inflight_requests += 1
+        metrics.inflight_recognition += recognition
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            metrics.inflight_requests -= 1
+            metrics.inflight_recognition -= recognition
+
+
+def process_resident_memory_bytes() -> float:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return float(resident_pages * os.sysconf("SC_PAGE_SIZE"))
+    except (OSError, ValueError, IndexError):
+        # Non-Linux fallback: peak RSS (kilobytes on Linux/BSD, bytes on macOS)
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return float(peak if sys.platform == "darwin" else peak * 1024)
+
+
+metrics = MetricsRegistry()
+metrics.register_gauge(
+    "process_resident_memory_bytes",
+    "Resident memory size in bytes",
+    process_resident_memory_bytes,
+)
@@ -0,0 +1,198 @@
+"""
+On-demand profiling
+Sampling CPU profiler producing collapsed stacks (flamegraph.pl /
+speedscope compatible) and tracemalloc allocation diffs attributed to
+selected functions. Nothing runs unless a profile is in progress.
+"""
+
+import os
+import sys
+import queue
+import inspect
+import selectors
+import threading
+import tracemalloc
+import concurrent.futures.thread
+from collections import Counter
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Frames kept per allocation traceback while tracemalloc is tracing
+TRACE_DEPTH = 25
+
+
+class ProfilerBusy(Exception):
+    """Raised when a profile is requested while another is running"""
+
+
+_lock = threading.Lock()
+_active: Optional[str] = None
+
+
+def acquire(kind: str):
+    """Mark a profile as running; raises ProfilerBusy if one already is"""
+    global _active
+    with _lock:
+        if _active is not None:
+            raise ProfilerBusy(f"A {_active} profile is already running")
+        _active = kind
+
+
+def release():
+    global _active
+    with _lock:
+        _active = None
+
+
+# ============ CPU Sampling ============
+
+# Python functions that are the innermost frame while a thread is blocked
+# in C: selector polls (the idle event loop), condition/event/queue waits
+# and thread-pool workers waiting for a work item
+IDLE_LEAVES = {
+    (selectors.__file__, "select"),
+    (threading.__file__, "wait"),
+    (threading.__file__, "_wait_for_tstate_lock"),
+    (queue.__file__, "get"),
+    (concurrent.futures.thread.__file__, "_worker"),
+}
+
+
+def _is_idle(frame) -> bool:
+    return (frame.f_code.co_filename, frame.f_code.co_name) in IDLE_LEAVES
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class CpuSampler:
+    """
+    Samples the stacks of all other threads every `interval` seconds from a
+    background thread and counts identical stacks. Stacks blocked in a known
+    wait (see IDLE_LEAVES) are skipped and only counted in `idle`, so the
+    profile shows where threads spend time working rather than waiting;
+    other blocking calls (sleeps, socket reads) still appear.
+    """
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0
+        self._stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="cpu-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                if _is_idle(frame):
+                    self.idle += 1
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self._stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """One `root;...;leaf count` line per distinct stack"""
+        return "".join(
+            f"{stack} {count}\n"
+            for stack, count in sorted(self._stacks.items(), key=lambda item: -item[1])
+        )
+
+
+# ============ Allocation Tracking ============
+
+def start_tracing() -> bool:
+    """Start tracemalloc if needed; returns True if this call started it"""
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+        return False
+    tracemalloc.start(TRACE_DEPTH)
+    return True
+
+
+def stop_tracing():
+    tracemalloc.stop()
+
+
+def peak_traced_memory() -> int:
+    """Peak traced memory since tracing started (transient buffers included)"""
+    return tracemalloc.get_traced_memory()[1]
+
+
+def take_snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ])
+
+
+def _line_range(fn: Callable) -> Tuple[str, int, int]:
+    fn = inspect.unwrap(fn)
+    lines, first = inspect.getsourcelines(fn)
+    return fn.__code__.co_filename, first, first + len(lines) - 1
+
+
+def _owner(traceback: tracemalloc.Traceback, ranges: Dict[str, Tuple[str, int, int]]) -> str:
+    """Innermost target function on the traceback, or 'other'"""
+    for frame in reversed(traceback):  # most recent call first
+        for name, (filename, first, last) in ranges.items():
+            if frame.filename == filename and first <= frame.lineno <= last:
+                return name
+    return "other"
+
+
+def allocation_diff(
+    before: tracemalloc.Snapshot,
+    after: tracemalloc.Snapshot,
+    targets: Dict[str, Callable],
+    top: int = 10,
+) -> Dict[str, Any]:
+    """
+    Attribute allocation growth between two snapshots to target functions.
+    An allocation counts towards the innermost target function on its
+    traceback; the rest is reported as `other`.
+    """
+    ranges = {name: _line_range(fn) for name, fn in targets.items()}
+    totals: Dict[str, Dict[str, Any]] = {
+        name: {"size_diff": 0, "count_diff": 0, "sites": Counter()}
+        for name in list(targets) + ["other"]
+    }
+
+    for stat in after.compare_to(before, "traceback"):
+        if not stat.size_diff and not stat.count_diff:
+            continue
+
+        site = stat.traceback[-1]
+        entry = totals[_owner(stat.traceback, ranges)]
+        entry["size_diff"] += stat.size_diff
+        entry["count_diff"] += stat.count_diff
+        entry["sites"][f"{site.filename}:{site.lineno}"] += stat.size_diff
+
+    report: Dict[str, Any] = {}
+    for name, entry in totals.items():
+        report[name] = {
+            "size_diff_bytes": entry["size_diff"],
+            "count_diff": entry["count_diff"],
+            "top_sites": [
+                {"site": site, "size_diff_bytes": size}
+                for site, size in sorted(entry["sites"].items(), key=lambda item: -abs(item[1]))[:top]
+            ],
+        }
+    return report
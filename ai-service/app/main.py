@@ -8,8 +8,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
-from app.api import face_routes, health_routes
+from app.api import admin_routes, face_routes, health_routes, metrics_routes
 from app.core.config import settings
+from app.core.metrics import ServerTimingMiddleware
+from app.services.replication import ReplicationFollower
 
 
 # =============================================================================
@@ -58,9 +60,22 @@ async def lifespan(app: FastAPI):
     else:
         print(f"✅ CORS configured for {len(allowed_origins)} origins")
     
+    follower = None
+    if settings.REPLICATION_LEADER_URL:
+        follower = ReplicationFollower(
+            face_routes.face_service,
+            settings.REPLICATION_LEADER_URL,
+            api_key=settings.REPLICATION_API_KEY,
+            poll_interval=settings.REPLICATION_POLL_INTERVAL,
+            page_size=settings.REPLICATION_PAGE_SIZE,
+        )
+        follower.start()
+    
     print(f"🚀 AI Face Recognition Service started on port {settings.PORT}")
     yield
     # Shutdown
+    if follower:
+        await follower.stop()
     print("👋 AI Face Recognition Service shutting down")
 
 
@@ -96,9 +111,21 @@ else:
         allow_headers=["Authorization", "Content-Type", "X-API-Key"],
     )
 
+# =============================================================================
+# Request Timing - Server-Timing header with per-stage durations
+# =============================================================================
+
+app.add_middleware(
+    ServerTimingMiddleware,
+    recognition_paths=[f"/api{path}" for path in face_routes.RECOGNITION_PATHS],
+)
+
+
 # Include routers
 app.include_router(health_routes.router, prefix="/api", tags=["Health"])
+app.include_router(metrics_routes.router, prefix="/api", tags=["Metrics"])
 app.include_router(face_routes.router, prefix="/api", tags=["Face Recognition"])
+app.include_router(admin_routes.router, prefix="/api", tags=["Admin"])
 
 
 @app.get("/")
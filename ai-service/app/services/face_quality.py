@@ -0,0 +1,91 @@
+"""
+Face Quality Checks
+Cheap pre-encoding checks on a detected face (size, blur, brightness, pose)
+so unusable frames are rejected before the expensive encoding step
+"""
+
+import math
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Reason codes returned to clients when a frame is rejected
+REASON_NO_FACE = "no_face_detected"
+REASON_TOO_SMALL = "face_too_small"
+REASON_TOO_BLURRY = "too_blurry"
+REASON_TOO_DARK = "too_dark"
+REASON_TOO_BRIGHT = "too_bright"
+REASON_BAD_POSE = "pose_out_of_range"
+
+# Face crops are downsampled to about this size before scoring, which keeps
+# the cost constant and makes blur scores comparable across face sizes
+SCORING_SIZE = 128
+
+FaceLocation = Tuple[int, int, int, int]  # (top, right, bottom, left)
+
+
+def face_size(location: FaceLocation) -> int:
+    """Shorter side of the face box in pixels"""
+    top, right, bottom, left = location
+    return min(bottom - top, right - left)
+
+
+def face_crop_gray(image: np.ndarray, location: FaceLocation) -> np.ndarray:
+    """Downsampled grayscale crop of the face box"""
+    top, right, bottom, left = location
+    height, width = image.shape[:2]
+    crop = image[max(top, 0):min(bottom, height), max(left, 0):min(right, width)]
+
+    step = max(1, max(crop.shape[:2]) // SCORING_SIZE)
+    crop = crop[::step, ::step]
+
+    if crop.ndim == 3:
+        # ITU-R 601 luma
+        return crop[..., 0] * 0.299 + crop[..., 1] * 0.587 + crop[..., 2] * 0.114
+    return crop.astype(np.float64)
+
+
+def blur_score(gray: np.ndarray) -> float:
+    """Variance of the Laplacian; low values mean a blurred face"""
+    if gray.shape[0] < 3 or gray.shape[1] < 3:
+        return 0.0
+    laplacian = (
+        gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1]
+        - 4 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+def brightness(gray: np.ndarray) -> float:
+    """Mean luma (0-255)"""
+    return float(gray.mean()) if gray.size else 0.0
+
+
+def estimate_pose(landmarks: Dict[str, List[Tuple[int, int]]]) -> Optional[Dict[str, float]]:
+    """
+    Rough yaw and roll from 5-point landmarks (eyes + nose tip).
+    yaw is the nose offset from the eye midpoint relative to eye distance
+    (0 = frontal); roll is the eye line angle in degrees.
+    """
+    try:
+        left_eye = np.mean(landmarks["left_eye"], axis=0)
+        right_eye = np.mean(landmarks["right_eye"], axis=0)
+        nose = np.mean(landmarks["nose_tip"], axis=0)
+    except (KeyError, ValueError):
+        return None
+
+    # Order eyes left-to-right in image space regardless of landmark naming
+    if left_eye[0] > right_eye[0]:
+        left_eye, right_eye = right_eye, left_eye
+
+    dx, dy = right_eye - left_eye
+    eye_distance = math.hypot(dx, dy)
+    if eye_distance == 0:
+        return None
+
+    eye_mid = (left_eye + right_eye) / 2
+    # Project the nose offset onto the eye line so roll does not leak into yaw
+    yaw = ((nose[0] - eye_mid[0]) * dx + (nose[1] - eye_mid[1]) * dy) / (eye_distance ** 2)
+    roll = math.degrees(math.atan2(dy, dx))
+
+    return {"yaw": round(float(yaw), 3), "roll": round(float(roll), 1)}
@@ -9,9 +9,14 @@ import re
 import json
 import base64
 import pickle
+import time
 import uuid
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple, AsyncIterator, Iterator, Union
 from datetime import datetime
 
 import numpy as np
@@ -26,6 +31,15 @@ except ImportError:
     print("⚠️ face_recognition library not available. Install with: pip install face-recognition")
 
 from app.core.config import settings
+from app.core.metrics import metrics
+from app.services import face_quality, snapshot
+from app.services.gallery_index import GalleryIndex
+from app.services.user_index import UserIndex
+from app.services.profiles import ProfileSelector, RecognitionProfile
+
+
+# Present in FACE_ENCODINGS_PATH while a snapshot restore is rewriting pickles
+RESTORE_MARKER = ".restore-pending"
 
 
 class FaceRecognitionService:
@@ -42,17 +56,96 @@ class FaceRecognitionService:
         self.encodings_path = settings.FACE_ENCODINGS_PATH
         self.tolerance = settings.FACE_RECOGNITION_TOLERANCE
         self.min_confidence = settings.MIN_CONFIDENCE_SCORE
+        self.profiles = ProfileSelector(settings.RECOGNITION_PROFILES)
         
         # In-memory cache of encodings (loaded from disk)
         self._encodings_cache: Dict[str, List[np.ndarray]] = {}
         self._user_metadata: Dict[str, Dict[str, Any]] = {}
         
+        # All encodings stacked into one matrix for vectorised search
+        self._gallery = GalleryIndex()
+        self._user_index = UserIndex()
+        
+        # Worker threads for batch decoding/encoding (created on first use)
+        self._batch_executor: Optional[ThreadPoolExecutor] = None
+        self._batch_encoding = 0  # Batch images submitted to workers and not yet done
+        
+        # Change feed: seq -> (user_id, deleted), keeping only the latest
+        # change per user so deltas stay proportional to changed users.
+        # Sequence numbers restart with every process, identified by epoch;
+        # followers replay the whole gallery whenever the epoch changes.
+        self.feed_epoch = uuid.uuid4().hex
+        self._feed_version = 0
+        self._feed_index: Dict[int, Tuple[str, bool]] = {}
+        self._feed_seq_by_user: Dict[str, int] = {}
+        
+        # Last snapshot written or restored; incremental snapshots build on it
+        self._snapshot_base: Optional[Dict[str, Any]] = None
+        self._snapshot_lock = asyncio.Lock()
+        
+        # Pickle writes from the event loop and from restore threads are
+        # serialized; each on-loop write bumps the user's disk version so a
+        # restore thread never overwrites a newer save
+        self._disk_lock = threading.Lock()
+        self._disk_versions: Dict[str, int] = {}
+        
         # Create directories
         os.makedirs(self.encodings_path, exist_ok=True)
         os.makedirs(settings.TEMP_UPLOAD_PATH, exist_ok=True)
         
-        # Load existing encodings on startup
-        self._load_encodings()
+        # Load existing encodings on startup. A fresh container with no
+        # pickles restores from the latest snapshot chain instead, and an
+        # interrupted restore (marker still present) is redone.
+        self._persist_thread: Optional[threading.Thread] = None
+        with metrics.timed("gallery_load"):
+            marker = self._read_restore_marker()
+            restored = None
+            if marker is not None:
+                print("⚠️  A snapshot restore did not finish writing encodings; restoring it again")
+            if marker is not None or (settings.SNAPSHOT_RESTORE_ON_STARTUP and not self._has_pickles()):
+                try:
+                    chain = snapshot.find_restore_chain(settings.SNAPSHOT_PATH, (marker or {}).get("snapshot"))
+                    restored = self._read_snapshot_chain(chain) if chain else None
+                except (OSError, snapshot.SnapshotError) as e:
+                    print(f"⚠️  Snapshot restore failed: {e}")
+            
+            if restored:
+                users, _ = self._install_gallery(*restored)
+                self._write_restore_marker(os.path.basename(chain[-1]))
+                self._persist_thread = threading.Thread(
+                    target=self._persist_restored, args=(self._restore_writes(users),), daemon=True,
+                )
+                self._persist_thread.start()
+                print(f"📦 Restored face encodings for {len(self._encodings_cache)} users from {len(chain)} snapshot(s)")
+            else:
+                if marker is not None:
+                    print("⚠️  Loading encodings from disk; the gallery may be incomplete")
+                self._load_encodings()
+                self._rebuild_index()
+                for user_id in sorted(self._encodings_cache):
+                    self._append_feed(user_id)
+        
+        # Gallery gauges are read on every metrics scrape
+        metrics.register_gauge(
+            "face_gallery_users",
+            "Number of users with stored face encodings",
+            lambda: len(self._encodings_cache),
+        )
+        metrics.register_gauge(
+            "face_gallery_encodings",
+            "Total number of stored face encodings",
+            lambda: sum(len(encs) for encs in self._encodings_cache.values()),
+        )
+        metrics.register_gauge(
+            "face_gallery_bytes",
+            "Memory held by the gallery search matrix",
+            lambda: self._gallery.nbytes,
+        )
+        metrics.register_gauge(
+            "face_gallery_version",
+            "Latest change feed sequence number",
+            lambda: self._feed_version,
+        )
     
     def _validate_user_id(self, user_id: str) -> str:
         """
@@ -113,13 +206,416 @@ class FaceRecognitionService:
     
     def _save_user_encodings(self, user_id: str):
         """Save user encodings to disk (user_id already validated)"""
-        filepath = self._get_user_filepath(user_id)
-        data = {
+        self._write_user_file(user_id, {
             'encodings': self._encodings_cache.get(user_id, []),
             'metadata': self._user_metadata.get(user_id, {}),
+        })
+    
+    def _write_user_file(self, user_id: str, data: Optional[Dict[str, Any]]):
+        """
+        Write a user's pickle (or delete it when `data` is None) and bump
+        the user's disk version. Safe to call from worker threads when
+        `data` is a copy.
+        """
+        filepath = self._get_user_filepath(user_id)
+        with metrics.timed("persistence"), self._disk_lock:
+            if data is None:
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+            else:
+                with open(filepath, 'wb') as f:
+                    pickle.dump(data, f)
+            self._disk_versions[user_id] = self._disk_versions.get(user_id, 0) + 1
+    
+    def _record_change(self, user_id: str, deleted: bool = False):
+        """Sync the search and listing indexes with user_id's current state and log the change"""
+        if deleted:
+            self._gallery.remove_user(user_id)
+            self._user_index.remove(user_id)
+        else:
+            self._gallery.set_user(user_id, self._encodings_cache.get(user_id, []))
+            self._user_index.put(
+                user_id,
+                len(self._encodings_cache.get(user_id, [])),
+                self._user_metadata.get(user_id, {}),
+            )
+        self._append_feed(user_id, deleted)
+    
+    def _append_feed(self, user_id: str, deleted: bool = False):
+        """Append a change for user_id to the feed, superseding its previous entry"""
+        self._feed_version += 1
+        previous = self._feed_seq_by_user.pop(user_id, None)
+        if previous is not None:
+            del self._feed_index[previous]
+        self._feed_index[self._feed_version] = (user_id, deleted)
+        self._feed_seq_by_user[user_id] = self._feed_version
+    
+    @property
+    def feed_version(self) -> int:
+        return self._feed_version
+    
+    def _feed_since(self, since: int) -> List[int]:
+        """Feed sequence numbers greater than `since`, oldest first"""
+        # Walk back from the newest entry so cost scales with the delta size
+        pending: List[int] = []
+        for seq in reversed(self._feed_index):
+            if seq <= since:
+                break
+            pending.append(seq)
+        pending.reverse()
+        return pending
+    
+    def _has_pickles(self) -> bool:
+        with os.scandir(self.encodings_path) as entries:
+            return any(entry.name.endswith('.pkl') for entry in entries)
+    
+    def _rebuild_index(self):
+        """Build the search and listing indexes from the in-memory gallery in one pass"""
+        user_ids = [user_id for user_id, encs in self._encodings_cache.items() if encs]
+        counts = [len(self._encodings_cache[user_id]) for user_id in user_ids]
+        matrix = (
+            np.stack([enc for user_id in user_ids for enc in self._encodings_cache[user_id]])
+            if user_ids else np.empty((0, self._gallery.dim))
+        )
+        self._gallery.load(user_ids, counts, matrix)
+        self._load_user_index()
+    
+    def _load_user_index(self):
+        self._user_index.load(
+            (user_id, len(self._encodings_cache.get(user_id, [])), metadata)
+            for user_id, metadata in self._user_metadata.items()
+        )
+    
+    # ============ Snapshots ============
+    
+    async def create_snapshot(self, incremental: bool = False) -> Dict[str, Any]:
+        """
+        Write the gallery to a single snapshot file in SNAPSHOT_PATH.
+        Incremental snapshots hold only users changed or deleted since the
+        last snapshot written or restored by this process; without one, a
+        full snapshot is written instead.
+        """
+        # Serialized with restores so every incremental chains to the last snapshot
+        async with self._snapshot_lock:
+            return await self._write_snapshot(incremental)
+    
+    async def _write_snapshot(self, incremental: bool) -> Dict[str, Any]:
+        base = self._snapshot_base
+        if incremental and not (base and base["epoch"] == self.feed_epoch):
+            incremental = False
+        
+        # Capture a consistent view on the event loop, then compress off it
+        if incremental:
+            changed = [self._feed_index[seq] for seq in self._feed_since(base["version"])]
+            user_ids = [user_id for user_id, deleted in changed if not deleted]
+            deleted_ids = [user_id for user_id, deleted in changed if deleted]
+        else:
+            user_ids = list(self._encodings_cache)
+            deleted_ids = []
+        
+        users = [
+            # Copies: encode_face may update metadata while the writer thread runs
+            (user_id, len(self._encodings_cache.get(user_id, [])), dict(self._user_metadata.get(user_id, {})))
+            for user_id in user_ids
+        ]
+        encodings = [enc for user_id in user_ids for enc in self._encodings_cache.get(user_id, [])]
+        matrix = np.asarray(encodings, dtype=np.float64).reshape(-1, self._gallery.dim)
+        
+        header = {
+            "snapshot_id": uuid.uuid4().hex,
+            "parent_id": base["snapshot_id"] if incremental else None,
+            "kind": snapshot.KIND_INCREMENTAL if incremental else snapshot.KIND_FULL,
+            "created_at": datetime.now().isoformat(),
+            "feed_epoch": self.feed_epoch,
+            "feed_version": self._feed_version,
+        }
+        
+        os.makedirs(settings.SNAPSHOT_PATH, exist_ok=True)
+        path = os.path.join(settings.SNAPSHOT_PATH, snapshot.snapshot_filename(header))
+        with metrics.timed("snapshot_write"):
+            written = await asyncio.to_thread(
+                snapshot.write_snapshot, path, header, users, deleted_ids, matrix,
+                settings.SNAPSHOT_COMPRESSION_LEVEL,
+            )
+        
+        self._snapshot_base = {
+            "snapshot_id": header["snapshot_id"],
+            "epoch": header["feed_epoch"],
+            "version": header["feed_version"],
         }
-        with open(filepath, 'wb') as f:
-            pickle.dump(data, f)
+        return {**written, "file": os.path.basename(path), "file_bytes": os.path.getsize(path)}
+    
+    async def restore_snapshot(self, name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Replace the gallery with a snapshot chain (the latest full snapshot
+        plus its incrementals, or the chain ending at `name`). Files are read
+        and verified off the event loop; the gallery is served from memory
+        at once and this returns after the pickles in FACE_ENCODINGS_PATH
+        have been rewritten (`persisted` is False if any write failed).
+        """
+        async with self._snapshot_lock:
+            return await self._restore_snapshot(name)
+    
+    async def _restore_snapshot(self, name: Optional[str]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        chain = await asyncio.to_thread(snapshot.find_restore_chain, settings.SNAPSHOT_PATH, name)
+        if not chain:
+            raise ValueError("No snapshot found to restore")
+        
+        # A startup restore may still be writing pickles
+        if self._persist_thread is not None and self._persist_thread.is_alive():
+            await asyncio.to_thread(self._persist_thread.join)
+        
+        with metrics.timed("snapshot_restore"):
+            restored = await asyncio.to_thread(self._read_snapshot_chain, chain)
+            users, removed = self._install_gallery(*restored)
+        
+        # Until the marker is cleared a restart redoes this restore
+        self._write_restore_marker(os.path.basename(chain[-1]))
+        with metrics.timed("persistence"):
+            failures = await asyncio.to_thread(self._persist_restored, self._restore_writes(users))
+        
+        return {
+            "success": True,
+            "persisted": failures == 0,
+            "restored_from": [os.path.basename(path) for path in chain],
+            "snapshot_id": restored[0]["snapshot_id"],
+            "user_count": len(self._encodings_cache),
+            "encoding_count": len(self._gallery),
+            "removed_users": len(removed),
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+    
+    def _read_snapshot_chain(self, chain: List[str]) -> Tuple[Dict[str, Any], List[str], List[int], np.ndarray, Dict[str, Dict[str, Any]]]:
+        """
+        Read and fold a snapshot chain. Returns the last header plus user
+        ids, encoding counts, the stacked encoding matrix and metadata.
+        """
+        header, meta, matrix = snapshot.read_snapshot(chain[0])
+        user_ids = [user_id for user_id, _, _ in meta["users"]]
+        counts = [count for _, count, _ in meta["users"]]
+        metadata = {user_id: user_meta for user_id, _, user_meta in meta["users"]}
+        
+        if len(chain) == 1:
+            # Common case: the full snapshot matrix is already in gallery order
+            return header, user_ids, counts, matrix, metadata
+        
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        rows = {user_id: matrix[offsets[i]:offsets[i + 1]] for i, user_id in enumerate(user_ids)}
+        
+        for path in chain[1:]:
+            header, meta, matrix = snapshot.read_snapshot(path)
+            for user_id in meta["deleted"]:
+                rows.pop(user_id, None)
+                metadata.pop(user_id, None)
+            offset = 0
+            for user_id, count, user_meta in meta["users"]:
+                rows[user_id] = matrix[offset:offset + count]
+                metadata[user_id] = user_meta
+                offset += count
+        
+        user_ids = list(rows)
+        counts = [len(rows[user_id]) for user_id in user_ids]
+        matrix = (
+            np.concatenate([rows[user_id] for user_id in user_ids])
+            if user_ids else np.empty((0, self._gallery.dim))
+        )
+        return header, user_ids, counts, matrix, metadata
+    
+    def _install_gallery(
+        self,
+        header: Dict[str, Any],
+        user_ids: List[str],
+        counts: List[int],
+        matrix: np.ndarray,
+        metadata: Dict[str, Dict[str, Any]],
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Swap a restored gallery into memory and record it in the change
+        feed. Returns (restored user ids, removed user ids).
+        """
+        for user_id in user_ids:
+            self._validate_user_id(user_id)
+        
+        removed = [user_id for user_id in self._encodings_cache if user_id not in metadata]
+        
+        cache: Dict[str, List[np.ndarray]] = {}
+        offset = 0
+        for user_id, count in zip(user_ids, counts):
+            cache[user_id] = list(matrix[offset:offset + count])
+            offset += count
+        
+        self._encodings_cache = cache
+        self._user_metadata = {user_id: dict(metadata.get(user_id, {})) for user_id in user_ids}
+        self._gallery.load(user_ids, counts, matrix)
+        self._load_user_index()
+        
+        for user_id in removed:
+            self._append_feed(user_id, deleted=True)
+        for user_id in user_ids:
+            self._append_feed(user_id)
+        
+        self._snapshot_base = {
+            "snapshot_id": header["snapshot_id"],
+            "epoch": self.feed_epoch,
+            "version": self._feed_version,
+        }
+        return user_ids, removed
+    
+    def _restore_marker_path(self) -> str:
+        return os.path.join(self.encodings_path, RESTORE_MARKER)
+    
+    def _read_restore_marker(self) -> Optional[Dict[str, Any]]:
+        """The pending-restore marker, or None when no restore is unfinished"""
+        try:
+            with open(self._restore_marker_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            return {}
+    
+    def _write_restore_marker(self, snapshot_name: str):
+        path = self._restore_marker_path()
+        with open(path + '.tmp', 'w') as f:
+            json.dump({"snapshot": snapshot_name, "started_at": datetime.now().isoformat()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+    
+    def _restore_writes(self, user_ids: List[str]) -> List[Tuple[str, int, Dict[str, Any]]]:
+        """
+        Pickle payloads for restored users, copied on the event loop, each
+        with the user's disk version at the time of the restore
+        """
+        return [
+            (
+                user_id,
+                self._disk_versions.get(user_id, 0),
+                {
+                    'encodings': list(self._encodings_cache.get(user_id, [])),
+                    'metadata': dict(self._user_metadata.get(user_id, {})),
+                },
+            )
+            for user_id in user_ids
+        ]
+    
+    def _persist_restored(self, writes: List[Tuple[str, int, Dict[str, Any]]]) -> int:
+        """
+        Write pickles for a restored gallery and drop pickles of users it
+        no longer has (runs off the event loop). The restore marker is
+        removed only when every write succeeded. Returns the failure count.
+        """
+        failures = 0
+        for user_id, version, data in writes:
+            try:
+                with self._disk_lock:
+                    # Saved again since the restore; that save is newer
+                    if self._disk_versions.get(user_id, 0) != version:
+                        continue
+                    with open(self._get_user_filepath(user_id), 'wb') as f:
+                        pickle.dump(data, f)
+            except (OSError, ValueError, pickle.PicklingError) as e:
+                failures += 1
+                print(f"Error persisting restored encodings for {user_id}: {e}")
+        
+        for filename in os.listdir(self.encodings_path):
+            if not filename.endswith('.pkl'):
+                continue
+            user_id = filename[:-len('.pkl')]
+            try:
+                with self._disk_lock:
+                    if user_id in self._encodings_cache:
+                        continue
+                    os.remove(os.path.join(self.encodings_path, filename))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                failures += 1
+                print(f"Error removing encodings for {user_id}: {e}")
+        
+        if failures:
+            print(f"⚠️  Restore left {failures} encoding files unwritten; it will be redone on restart")
+        else:
+            try:
+                os.remove(self._restore_marker_path())
+            except FileNotFoundError:
+                pass
+        return failures
+    
+    def get_changes(self, since: int = 0, limit: int = 500) -> Dict[str, Any]:
+        """
+        Changes with sequence number greater than `since`, oldest first.
+        Each user appears at most once with its current state; deleted
+        users appear as delete entries. Pass the returned `version` as the
+        next `since`; `has_more` means another page is waiting.
+        """
+        pending = self._feed_since(since)
+        page = pending[:limit]
+        has_more = len(pending) > limit
+        
+        changes = []
+        for seq in page:
+            user_id, deleted = self._feed_index[seq]
+            if deleted:
+                changes.append({"seq": seq, "op": "delete", "user_id": user_id})
+            else:
+                changes.append({
+                    "seq": seq,
+                    "op": "put",
+                    "user_id": user_id,
+                    "encodings": [
+                        base64.b64encode(np.asarray(enc, dtype=np.float64).tobytes()).decode('ascii')
+                        for enc in self._encodings_cache.get(user_id, [])
+                    ],
+                    "metadata": self._user_metadata.get(user_id, {}),
+                })
+        
+        return {
+            "epoch": self.feed_epoch,
+            "since": since,
+            "version": page[-1] if has_more else self._feed_version,
+            "has_more": has_more,
+            "changes": changes,
+        }
+    
+    async def apply_change(self, change: Dict[str, Any]):
+        """
+        Apply a change from another node's feed to the local gallery, then
+        write it to disk on a worker thread so a long catch-up never
+        blocks request handling
+        """
+        user_id = self._validate_user_id(change["user_id"])
+        
+        if change["op"] == "delete":
+            self._encodings_cache.pop(user_id, None)
+            self._user_metadata.pop(user_id, None)
+            self._record_change(user_id, deleted=True)
+            await asyncio.to_thread(self._write_user_file, user_id, None)
+        elif change["op"] == "put":
+            encodings = [
+                np.frombuffer(base64.b64decode(enc), dtype=np.float64).copy()
+                for enc in change.get("encodings", [])
+            ]
+            metadata = dict(change.get("metadata", {}))
+            self._encodings_cache[user_id] = encodings
+            self._user_metadata[user_id] = metadata
+            self._record_change(user_id)
+            data = {'encodings': list(encodings), 'metadata': dict(metadata)}
+            await asyncio.to_thread(self._write_user_file, user_id, data)
+        else:
+            raise ValueError(f"Unknown change op: {change['op']}")
+    
+    def enrolled_user_ids(self) -> List[str]:
+        return list(self._encodings_cache)
+    
+    def _remove_user(self, sanitized_id: str):
+        """Drop a user from memory and disk and record the deletion"""
+        self._encodings_cache.pop(sanitized_id, None)
+        self._user_metadata.pop(sanitized_id, None)
+        
+        self._write_user_file(sanitized_id, None)
+        self._record_change(sanitized_id, deleted=True)
     
     def _decode_image(self, image_base64: str) -> np.ndarray:
         """Decode base64 image to numpy array for face_recognition"""
@@ -127,23 +623,118 @@ class FaceRecognitionService:
         if ',' in image_base64:
             image_base64 = image_base64.split(',')[1]
         
-        image_data = base64.b64decode(image_base64)
-        image = Image.open(BytesIO(image_data))
+        with metrics.timed("decode_base64"):
+            image_data = base64.b64decode(image_base64)
         
-        # Convert to RGB if necessary
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        return self._decode_image_bytes(image_data)
+    
+    def _decode_image_bytes(self, image_data: bytes) -> np.ndarray:
+        """Decode raw image bytes to an RGB numpy array"""
+        with metrics.timed("decode_image"):
+            image = Image.open(BytesIO(image_data))
+            
+            # Convert to RGB if necessary
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            
+            return np.array(image)
+    
+    def _select_profile(
+        self,
+        profile: Optional[str],
+        deadline_ms: Optional[float],
+        default: str,
+        counted: bool = True,
+    ) -> RecognitionProfile:
+        """
+        Resolve the recognition profile for a request (raises ValueError if
+        unknown). Load is the other recognition requests in flight (the
+        caller's own request is among them when `counted`) plus batch
+        images occupying the batch workers; admin, listing and metrics
+        traffic does not count.
+        """
+        others = metrics.inflight_recognition - (1 if counted else 0)
+        queued = max(0, others) + min(self._batch_encoding, settings.BATCH_WORKERS)
+        return self.profiles.select(profile, default, deadline_ms, queued)
+    
+    def _detect_faces(self, image_array: np.ndarray, profile: RecognitionProfile) -> List[Tuple[int, int, int, int]]:
+        with metrics.timed("face_detection"):
+            return face_recognition.face_locations(
+                image_array,
+                number_of_times_to_upsample=profile.upsample,
+                model=profile.model,
+            )
+    
+    def _encode_faces(
+        self,
+        image_array: np.ndarray,
+        locations: List[Tuple[int, int, int, int]],
+        profile: RecognitionProfile,
+    ) -> List[np.ndarray]:
+        with metrics.timed("face_encoding"):
+            return face_recognition.face_encodings(
+                image_array,
+                locations,
+                num_jitters=profile.num_jitters,
+                model=profile.landmark_model,
+            )
+    
+    def _check_quality(
+        self,
+        image_array: np.ndarray,
+        location: Tuple[int, int, int, int],
+    ) -> Optional[str]:
+        """
+        Run cheap quality checks on a detected face before encoding.
+        Returns a rejection reason code, or None if the face is usable.
+        """
+        if not settings.QUALITY_GATE_ENABLED:
+            return None
+        
+        with metrics.timed("quality_check"):
+            reason = None
+            
+            if face_quality.face_size(location) < settings.MIN_FACE_SIZE:
+                reason = face_quality.REASON_TOO_SMALL
+            else:
+                gray = face_quality.face_crop_gray(image_array, location)
+                luma = face_quality.brightness(gray)
+                
+                if luma < settings.MIN_BRIGHTNESS:
+                    reason = face_quality.REASON_TOO_DARK
+                elif luma > settings.MAX_BRIGHTNESS:
+                    reason = face_quality.REASON_TOO_BRIGHT
+                elif face_quality.blur_score(gray) < settings.MIN_BLUR_SCORE:
+                    reason = face_quality.REASON_TOO_BLURRY
+                else:
+                    # 5-point landmarks are far cheaper than the encoding itself
+                    landmarks = face_recognition.face_landmarks(image_array, [location], model="small")
+                    pose = face_quality.estimate_pose(landmarks[0]) if landmarks else None
+                    if pose and (
+                        abs(pose["yaw"]) > settings.MAX_POSE_YAW
+                        or abs(pose["roll"]) > settings.MAX_POSE_ROLL
+                    ):
+                        reason = face_quality.REASON_BAD_POSE
         
-        return np.array(image)
+        if reason:
+            metrics.quality_rejections.inc(reason)
+        return reason
     
     async def encode_face(
         self,
         image_base64: str,
         user_id: str,
+        profile: Optional[str] = None,
+        deadline_ms: Optional[float] = None,
+        scope: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
-        Encode face from image and store for user
+        Encode face from image and store for user. `scope` (e.g. a branch or
+        class) is stored in the user's metadata for filtered listing.
         """
+        start = time.perf_counter()
+        selected = self._select_profile(profile, deadline_ms, settings.ENROLL_PROFILE)
+        
         if not FACE_RECOGNITION_AVAILABLE:
             return {
                 "success": False,
@@ -157,18 +748,30 @@ class FaceRecognitionService:
             image_array = self._decode_image(image_base64)
             
             # Find faces in image
-            face_locations = face_recognition.face_locations(image_array)
+            face_locations = self._detect_faces(image_array, selected)
             
             if not face_locations:
                 return {
                     "success": False,
                     "user_id": user_id,
                     "face_count": 0,
+                    "reason": face_quality.REASON_NO_FACE,
                     "message": "No faces detected in image",
                 }
             
-            # Get face encodings
-            face_encodings = face_recognition.face_encodings(image_array, face_locations)
+            # Reject unusable frames before the expensive encoding
+            reason = self._check_quality(image_array, face_locations[0])
+            if reason:
+                return {
+                    "success": False,
+                    "user_id": user_id,
+                    "face_count": len(face_locations),
+                    "reason": reason,
+                    "message": f"Face rejected by quality check: {reason}",
+                }
+            
+            # Get face encodings (only the first face is stored)
+            face_encodings = self._encode_faces(image_array, face_locations[:1], selected)
             
             if not face_encodings:
                 return {
@@ -189,16 +792,21 @@ class FaceRecognitionService:
             
             self._encodings_cache[user_id].append(encoding)
             self._user_metadata[user_id]["updated_at"] = datetime.now().isoformat()
+            if scope is not None:
+                self._user_metadata[user_id]["scope"] = scope
             self._user_metadata[user_id]["encoding_count"] = len(self._encodings_cache[user_id])
             
             # Save to disk
             self._save_user_encodings(user_id)
+            self._record_change(user_id)
+            self.profiles.record(selected, time.perf_counter() - start)
             
             return {
                 "success": True,
                 "user_id": user_id,
                 "encoding_id": str(uuid.uuid4()),
                 "face_count": len(face_locations),
+                "profile": selected.name,
                 "message": f"Face encoded. Total: {len(self._encodings_cache[user_id])}",
             }
             
@@ -213,10 +821,15 @@ class FaceRecognitionService:
     async def match_face(
         self,
         image_base64: str,
+        profile: Optional[str] = None,
+        deadline_ms: Optional[float] = None,
     ) -> Dict[str, Any]:
         """
         Match face against all stored encodings
         """
+        start = time.perf_counter()
+        selected = self._select_profile(profile, deadline_ms, settings.MATCH_PROFILE)
+        
         if not FACE_RECOGNITION_AVAILABLE:
             return {
                 "success": False,
@@ -230,18 +843,30 @@ class FaceRecognitionService:
             image_array = self._decode_image(image_base64)
             
             # Find faces
-            face_locations = face_recognition.face_locations(image_array)
+            face_locations = self._detect_faces(image_array, selected)
             
             if not face_locations:
                 return {
                     "success": False,
                     "matches": [],
                     "best_match": None,
+                    "reason": face_quality.REASON_NO_FACE,
                     "message": "No faces detected in image",
                 }
             
+            # Reject unusable frames before the expensive encoding
+            reason = self._check_quality(image_array, face_locations[0])
+            if reason:
+                return {
+                    "success": False,
+                    "matches": [],
+                    "best_match": None,
+                    "reason": reason,
+                    "message": f"Face rejected by quality check: {reason}",
+                }
+            
             # Get encoding for first face
-            face_encodings = face_recognition.face_encodings(image_array, face_locations)
+            face_encodings = self._encode_faces(image_array, face_locations[:1], selected)
             
             if not face_encodings:
                 return {
@@ -254,36 +879,15 @@ class FaceRecognitionService:
             unknown_encoding = face_encodings[0]
             
             # Compare against all stored encodings
-            matches = []
-            
-            for user_id, stored_encodings in self._encodings_cache.items():
-                if not stored_encodings:
-                    continue
-                
-                # Calculate distances to all encodings for this user
-                distances = face_recognition.face_distance(stored_encodings, unknown_encoding)
-                
-                # Get best (minimum) distance
-                min_distance = min(distances)
-                
-                # Convert distance to confidence (0-1, higher is better)
-                confidence = 1 - min_distance
-                
-                if confidence >= self.min_confidence:
-                    matches.append({
-                        "user_id": user_id,
-                        "confidence": round(float(confidence), 4),
-                        "display_name": self._user_metadata.get(user_id, {}).get("display_name"),
-                    })
-            
-            # Sort by confidence (highest first)
-            matches.sort(key=lambda x: x["confidence"], reverse=True)
+            matches = self._search_gallery([unknown_encoding])[0]
             best_match = matches[0] if matches else None
+            self.profiles.record(selected, time.perf_counter() - start)
             
             return {
                 "success": True,
                 "matches": matches,
                 "best_match": best_match,
+                "profile": selected.name,
                 "message": f"Found {len(matches)} matches",
             }
             
@@ -295,16 +899,235 @@ class FaceRecognitionService:
                 "message": f"Error: {str(e)}",
             }
     
+    def _search_gallery(self, query_encodings: List[np.ndarray]) -> List[List[Dict[str, Any]]]:
+        """
+        Match query encodings against the whole gallery in one matrix pass.
+        Returns, per query, matches above min_confidence sorted best first.
+        """
+        with metrics.timed("gallery_search"):
+            best_distances = self._gallery.search(
+                np.asarray(query_encodings),
+                max_distance=1 - self.min_confidence,
+            )
+        
+        results = []
+        for distances in best_distances:
+            matches = []
+            for user_id, min_distance in distances.items():
+                # Convert distance to confidence (0-1, higher is better)
+                confidence = 1 - min_distance
+                if confidence >= self.min_confidence:
+                    matches.append({
+                        "user_id": user_id,
+                        "confidence": round(float(confidence), 4),
+                        "display_name": self._user_metadata.get(user_id, {}).get("display_name"),
+                    })
+            
+            # Sort by confidence (highest first)
+            matches.sort(key=lambda x: x["confidence"], reverse=True)
+            results.append(matches)
+        return results
+    
+    def _prepare_batch_item(self, item: Dict[str, Any], profile: RecognitionProfile) -> Dict[str, Any]:
+        """Decode, quality-check and encode one batch image (runs in a worker thread)"""
+        result = {"index": item["index"], "id": item.get("id")}
+        
+        if item.get("error"):
+            return {**result, "success": False, "reason": "invalid_input", "message": item["error"]}
+        
+        try:
+            image: Union[bytes, str] = item["image"]
+            if isinstance(image, bytes):
+                image_array = self._decode_image_bytes(image)
+            else:
+                image_array = self._decode_image(image)
+            
+            face_locations = self._detect_faces(image_array, profile)
+            if not face_locations:
+                return {
+                    **result,
+                    "success": False,
+                    "reason": face_quality.REASON_NO_FACE,
+                    "message": "No faces detected in image",
+                }
+            
+            reason = self._check_quality(image_array, face_locations[0])
+            if reason:
+                return {
+                    **result,
+                    "success": False,
+                    "reason": reason,
+                    "message": f"Face rejected by quality check: {reason}",
+                }
+            
+            face_encodings = self._encode_faces(image_array, face_locations[:1], profile)
+            if not face_encodings:
+                return {**result, "success": False, "message": "Could not encode face for matching"}
+            
+            return {**result, "encoding": face_encodings[0]}
+        
+        except Exception as e:
+            return {**result, "success": False, "message": f"Error: {str(e)}"}
+    
+    def _finish_batch_items(self, prepared: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Match all encoded batch items against the gallery together"""
+        encoded = [item for item in prepared if "encoding" in item]
+        if encoded:
+            all_matches = self._search_gallery([item.pop("encoding") for item in encoded])
+            for item, matches in zip(encoded, all_matches):
+                item.update({
+                    "success": True,
+                    "matches": matches,
+                    "best_match": matches[0] if matches else None,
+                    "message": f"Found {len(matches)} matches",
+                })
+        return prepared
+    
+    def match_batch(
+        self,
+        items: AsyncIterator[Dict[str, Any]],
+        profile: Optional[str] = None,
+        deadline_ms: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Match a stream of images, yielding one result per image as it completes.
+        
+        `items` yields dicts with `index`, optional `id`, and `image` (raw
+        bytes or base64) or `error`. Decoding and encoding run on worker
+        threads with at most BATCH_MAX_IN_FLIGHT images held at once; encoded
+        images are gathered into micro-batches (up to BATCH_MAX_IN_FLIGHT, or
+        for BATCH_MATCH_WINDOW_MS) and each is matched as one matrix. A final
+        summary with `done: true` ends the stream. The profile is resolved
+        here so an unknown profile raises ValueError before streaming starts.
+        """
+        selected = self._select_profile(profile, deadline_ms, settings.MATCH_PROFILE, counted=False)
+        return self._match_batch_stream(items, selected)
+    
+    async def _match_batch_stream(
+        self,
+        items: AsyncIterator[Dict[str, Any]],
+        profile: RecognitionProfile,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        if not FACE_RECOGNITION_AVAILABLE:
+            yield {"done": True, "success": False, "message": "face_recognition library not available"}
+            return
+        
+        if self._batch_executor is None:
+            self._batch_executor = ThreadPoolExecutor(
+                max_workers=settings.BATCH_WORKERS,
+                thread_name_prefix="face-batch",
+            )
+        
+        loop = asyncio.get_running_loop()
+        window = settings.BATCH_MATCH_WINDOW_MS / 1000
+        pending: set = set()
+        ready: List[Dict[str, Any]] = []  # Encoded, waiting for the next gallery search
+        ready_since = 0.0
+        processed = matched = 0
+        
+        def submit(item: Dict[str, Any]):
+            # Copy the context so stage timings reach the request's collector
+            context = contextvars.copy_context()
+            self._batch_encoding += 1
+            return loop.run_in_executor(
+                self._batch_executor, context.run, self._prepare_batch_item, item, profile,
+            )
+        
+        def flush() -> List[Dict[str, Any]]:
+            nonlocal processed, matched
+            results = self._finish_batch_items(ready[:])
+            ready.clear()
+            processed += len(results)
+            matched += sum(1 for result in results if result.get("best_match"))
+            return results
+        
+        # Reading the next input item races with the workers, so encoded
+        # images are searched as one micro-batch (up to BATCH_MAX_IN_FLIGHT,
+        # or after BATCH_MATCH_WINDOW_MS) even while the upload stalls
+        source = items.__aiter__()
+        next_item: Optional[asyncio.Future] = None
+        exhausted = False
+        
+        try:
+            while True:
+                # Apply backpressure on the input once enough images are in flight
+                if not exhausted and next_item is None and len(pending) < settings.BATCH_MAX_IN_FLIGHT:
+                    next_item = asyncio.ensure_future(source.__anext__())
+                
+                waiting = pending | ({next_item} if next_item else set())
+                if not waiting:
+                    break
+                timeout = max(0.0, ready_since + window - loop.time()) if ready else None
+                done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                
+                if next_item is not None and next_item in done:
+                    done.discard(next_item)
+                    read, next_item = next_item, None
+                    try:
+                        item = read.result()
+                    except StopAsyncIteration:
+                        exhausted = True
+                    except Exception:
+                        # Input failed: report what is already encoded, then re-raise
+                        for future in done:
+                            ready.append(future.result())
+                        pending -= done
+                        self._batch_encoding -= len(done)
+                        for result in flush():
+                            yield result
+                        raise
+                    else:
+                        if item["index"] >= settings.BATCH_MAX_IMAGES:
+                            exhausted = True
+                            yield {
+                                "index": item["index"],
+                                "success": False,
+                                "reason": "batch_limit_exceeded",
+                                "message": f"Batch limit of {settings.BATCH_MAX_IMAGES} images reached",
+                            }
+                        else:
+                            pending.add(submit(item))
+                
+                if done:
+                    if not ready:
+                        ready_since = loop.time()
+                    ready.extend(future.result() for future in done)
+                    pending -= done
+                    self._batch_encoding -= len(done)
+                
+                if ready and (
+                    len(ready) >= settings.BATCH_MAX_IN_FLIGHT
+                    or loop.time() - ready_since >= window
+                    or (exhausted and not pending)
+                ):
+                    for result in flush():
+                        yield result
+        finally:
+            for future in pending:
+                future.cancel()
+            self._batch_encoding -= len(pending)
+            if next_item is not None:
+                next_item.cancel()
+        
+        yield {
+            "done": True,
+            "processed": processed,
+            "matched": matched,
+            "message": f"Processed {processed} images, {matched} matched",
+        }
+    
     async def train_user(
         self,
         user_id: str,
         images_base64: List[str],
+        profile: Optional[str] = None,
+        scope: Optional[str] = None,
     ) -> Dict[str, Any]:
         """Train with multiple images for a user"""
         processed = 0
         
         for image_base64 in images_base64:
-            result = await self.encode_face(image_base64, user_id)
+            result = await self.encode_face(image_base64, user_id, profile=profile, scope=scope)
             if result["success"]:
                 processed += 1
         
@@ -319,23 +1142,32 @@ class FaceRecognitionService:
         """Delete all encodings for a user (with path traversal protection)"""
         # Validate user_id first
         sanitized_id = self._validate_user_id(user_id)
-        
-        self._encodings_cache.pop(sanitized_id, None)
-        self._user_metadata.pop(sanitized_id, None)
-        
-        filepath = self._get_user_filepath(sanitized_id)
-        if os.path.exists(filepath):
-            os.remove(filepath)
-        
+        self._remove_user(sanitized_id)
         return True
     
-    async def list_enrolled_users(self) -> List[Dict[str, Any]]:
-        """List all users with face encodings"""
-        return [
-            {
-                "user_id": user_id,
-                "embedding_count": len(self._encodings_cache.get(user_id, [])),
-                **metadata,
-            }
-            for user_id, metadata in self._user_metadata.items()
-        ]
+    def page_enrolled_users(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        updated_since: Optional[str] = None,
+        scope: Optional[str] = None,
+        min_encodings: int = 0,
+    ) -> Tuple[List[str], Optional[str]]:
+        """
+        User ids for one page of the enrolled-user listing and the cursor
+        of the next page (None on the last page). Raises ValueError for a
+        malformed cursor or timestamp.
+        """
+        return self._user_index.page(limit, cursor, updated_since, scope, min_encodings)
+    
+    def iter_enrolled_user_json(self, user_ids: List[str]) -> Iterator[bytes]:
+        """Cached JSON of each listed user, skipping users deleted since paging"""
+        for user_id in user_ids:
+            line = self._user_index.line(user_id)
+            if line is not None:
+                yield line
+    
+    async def list_enrolled_users(self, **filters) -> List[Dict[str, Any]]:
+        """List users with face encodings (accepts the page_enrolled_users filters)"""
+        user_ids, _ = self.page_enrolled_users(**filters)
+        return [self._user_index.get(user_id) for user_id in user_ids]
@@ -0,0 +1,192 @@
+"""
+Gallery Index
+Dense matrix of all stored face encodings for vectorised matching
+"""
+
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ENCODING_SIZE = 128
+
+# Upper bound on query x gallery distance matrix elements per chunk (~32MB)
+MAX_DISTANCE_ELEMENTS = 4_000_000
+
+
+class GalleryIndex:
+    """
+    Encodings of all users stacked into one matrix.
+
+    Rows are appended on enrollment; rows of replaced or deleted users are
+    tombstoned and reclaimed by compaction once they make up a quarter of
+    the matrix, so updates never rebuild the whole index.
+    """
+
+    def __init__(self, dim: int = ENCODING_SIZE, capacity: int = 1024):
+        self.dim = dim
+        self._matrix = np.zeros((capacity, dim), dtype=np.float64)
+        self._sq_norms = np.full(capacity, np.inf)
+        self._owner = np.full(capacity, -1, dtype=np.int64)
+        self._size = 0
+        self._dead = 0
+
+        # user slot <-> user_id, and the rows each user currently owns
+        self._slot_user: List[Optional[str]] = []
+        self._user_slot: Dict[str, int] = {}
+        self._user_rows: Dict[str, np.ndarray] = {}
+        self._free_slots: List[int] = []
+
+    def __len__(self) -> int:
+        return self._size - self._dead
+
+    @property
+    def nbytes(self) -> int:
+        return self._matrix.nbytes + self._sq_norms.nbytes + self._owner.nbytes
+
+    def _ensure_capacity(self, extra: int):
+        needed = self._size + extra
+        capacity = len(self._matrix)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.dim), dtype=np.float64)
+        matrix[:self._size] = self._matrix[:self._size]
+        sq_norms = np.full(capacity, np.inf)
+        sq_norms[:self._size] = self._sq_norms[:self._size]
+        owner = np.full(capacity, -1, dtype=np.int64)
+        owner[:self._size] = self._owner[:self._size]
+        self._matrix, self._sq_norms, self._owner = matrix, sq_norms, owner
+
+    def _tombstone(self, rows: np.ndarray):
+        self._matrix[rows] = 0.0
+        self._sq_norms[rows] = np.inf
+        self._owner[rows] = -1
+        self._dead += len(rows)
+
+    def load(self, user_ids: List[str], counts: List[int], matrix: np.ndarray):
+        """
+        Replace the whole index in one pass. Rows of `matrix` belong to
+        `user_ids` in order, `counts[i]` rows each.
+        """
+        matrix = np.asarray(matrix, dtype=np.float64).reshape(-1, self.dim)
+        size = len(matrix)
+        capacity = max(1024, size)
+
+        self._matrix = np.zeros((capacity, self.dim), dtype=np.float64)
+        self._matrix[:size] = matrix
+        self._sq_norms = np.full(capacity, np.inf)
+        self._sq_norms[:size] = np.einsum('ij,ij->i', matrix, matrix)
+        self._owner = np.full(capacity, -1, dtype=np.int64)
+        self._size = size
+        self._dead = 0
+
+        kept = [(user_id, count) for user_id, count in zip(user_ids, counts) if count]
+        self._slot_user = [user_id for user_id, _ in kept]
+        self._user_slot = {user_id: slot for slot, user_id in enumerate(self._slot_user)}
+        self._free_slots = []
+
+        kept_counts = np.array([count for _, count in kept], dtype=np.int64)
+        self._owner[:size] = np.repeat(np.arange(len(kept)), kept_counts)
+        ends = np.cumsum(kept_counts)
+        self._user_rows = {
+            user_id: np.arange(end - count, end)
+            for (user_id, count), end in zip(kept, ends)
+        }
+
+    def set_user(self, user_id: str, encodings: List[np.ndarray]):
+        """Replace all rows for user_id with `encodings`"""
+        self.remove_user(user_id)
+        if not len(encodings):
+            return
+
+        block = np.asarray(encodings, dtype=np.float64).reshape(-1, self.dim)
+        self._ensure_capacity(len(block))
+
+        if self._free_slots:
+            slot = self._free_slots.pop()
+            self._slot_user[slot] = user_id
+        else:
+            slot = len(self._slot_user)
+            self._slot_user.append(user_id)
+        self._user_slot[user_id] = slot
+
+        rows = np.arange(self._size, self._size + len(block))
+        self._matrix[rows] = block
+        self._sq_norms[rows] = np.einsum('ij,ij->i', block, block)
+        self._owner[rows] = slot
+        self._user_rows[user_id] = rows
+        self._size += len(block)
+
+    def remove_user(self, user_id: str):
+        rows = self._user_rows.pop(user_id, None)
+        if rows is None:
+            return
+        self._tombstone(rows)
+        slot = self._user_slot.pop(user_id)
+        self._slot_user[slot] = None
+        self._free_slots.append(slot)
+
+        if self._dead > max(1024, self._size // 4):
+            self.compact()
+
+    def compact(self):
+        """Drop tombstoned rows"""
+        live = np.nonzero(self._owner[:self._size] >= 0)[0]
+        count = len(live)
+        self._matrix[:count] = self._matrix[live]
+        self._sq_norms[:count] = self._sq_norms[live]
+        self._owner[:count] = self._owner[live]
+        self._matrix[count:self._size] = 0.0
+        self._sq_norms[count:self._size] = np.inf
+        self._owner[count:self._size] = -1
+
+        # Rows moved; rebuild each user's row list from the owner column
+        order = np.argsort(self._owner[:count], kind='stable')
+        owners = self._owner[:count][order]
+        boundaries = np.nonzero(np.diff(owners))[0] + 1
+        self._user_rows = {
+            self._slot_user[group_owners[0]]: rows
+            for rows, group_owners in zip(np.split(order, boundaries), np.split(owners, boundaries))
+            if len(rows)
+        }
+
+        self._size = count
+        self._dead = 0
+
+    def search(self, queries: np.ndarray, max_distance: float) -> List[Dict[str, float]]:
+        """
+        For each query encoding, the best distance per user among users
+        with at least one encoding within `max_distance`.
+        """
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, self.dim)
+        results: List[Dict[str, float]] = [{} for _ in range(len(queries))]
+        if not len(queries) or self._size == 0:
+            return results
+
+        matrix = self._matrix[:self._size]
+        sq_norms = self._sq_norms[:self._size]
+        chunk = max(1, MAX_DISTANCE_ELEMENTS // self._size)
+
+        for start in range(0, len(queries), chunk):
+            block = queries[start:start + chunk]
+            # |q - x|^2 = |q|^2 + |x|^2 - 2 q.x ; tombstoned rows come out as inf
+            sq_dist = (
+                np.einsum('ij,ij->i', block, block)[:, None]
+                + sq_norms[None, :]
+                - 2.0 * (block @ matrix.T)
+            )
+            # Small slack so rounding never drops a true candidate
+            candidate_q, candidate_rows = np.nonzero(sq_dist <= (max_distance + 1e-6) ** 2)
+
+            for q, row in zip(candidate_q, candidate_rows):
+                # Exact distance for the few candidates under the threshold
+                distance = float(np.linalg.norm(matrix[row] - block[q]))
+                if distance > max_distance:
+                    continue
+                user_id = self._slot_user[self._owner[row]]
+                best = results[start + q]
+                if distance < best.get(user_id, np.inf):
+                    best[user_id] = distance
+
+        return results
@@ -0,0 +1,115 @@
+"""
+Recognition Profiles
+Named speed/accuracy trade-offs for face detection and encoding, and
+deadline-aware selection based on observed latency and current load
+"""
+
+import threading
+from typing import Any, Dict, List, Optional
+
+# Weight of the newest sample in the per-profile latency average
+EWMA_ALPHA = 0.2
+# Share of the gap to the configured estimate recovered each time a
+# profile is passed over, so one slow spike cannot exclude it for good
+SKIPPED_DECAY = 0.05
+
+
+class RecognitionProfile:
+    """Detection and encoding parameters for one profile"""
+
+    def __init__(self, name: str, config: Dict[str, Any]):
+        self.name = name
+        self.upsample = int(config.get("upsample", 1))
+        self.model = config.get("model", "hog")
+        self.landmark_model = config.get("landmark_model", "large")
+        self.num_jitters = int(config.get("num_jitters", 1))
+        self.estimated_ms = float(config.get("estimated_ms", 250))
+
+        if self.model not in ("hog", "cnn"):
+            raise ValueError(f"Profile {name}: model must be 'hog' or 'cnn'")
+        if self.landmark_model not in ("small", "large"):
+            raise ValueError(f"Profile {name}: landmark_model must be 'small' or 'large'")
+
+
+class ProfileSelector:
+    """
+    Resolves profile names and picks a profile for a latency deadline.
+    Profiles are ordered by their configured estimate; a more expensive
+    profile is assumed to be more accurate.
+    """
+
+    def __init__(self, profiles: Dict[str, Dict[str, Any]]):
+        if not profiles:
+            raise ValueError("At least one recognition profile must be configured")
+        self.profiles = {name: RecognitionProfile(name, config) for name, config in profiles.items()}
+        self._ordered: List[RecognitionProfile] = sorted(
+            self.profiles.values(), key=lambda p: p.estimated_ms
+        )
+        self._lock = threading.Lock()
+        # Observed latency per profile, in seconds, starting at the
+        # configured estimate
+        self._observed: Dict[str, float] = {
+            name: profile.estimated_ms / 1000 for name, profile in self.profiles.items()
+        }
+
+    def get(self, name: str) -> RecognitionProfile:
+        profile = self.profiles.get(name)
+        if profile is None:
+            raise ValueError(
+                f"Unknown recognition profile '{name}'. "
+                f"Available: {', '.join(p.name for p in self._ordered)}"
+            )
+        return profile
+
+    def estimate(self, profile: RecognitionProfile) -> float:
+        """Expected service time for one request with this profile, in seconds"""
+        with self._lock:
+            return self._observed[profile.name]
+
+    def record(self, profile: RecognitionProfile, duration: float):
+        """Fold an observed request duration into the profile's estimate"""
+        with self._lock:
+            previous = self._observed[profile.name]
+            self._observed[profile.name] = previous + EWMA_ALPHA * (duration - previous)
+
+    def _decay_skipped(self, candidates: List[RecognitionProfile], selected: RecognitionProfile):
+        """
+        Move the estimates of profiles that were not chosen back toward
+        their configured value. A skipped profile records no new samples,
+        so without this a single slow request would keep it out of
+        deadline selection indefinitely.
+        """
+        with self._lock:
+            for profile in candidates:
+                if profile is not selected:
+                    prior = profile.estimated_ms / 1000
+                    observed = self._observed[profile.name]
+                    self._observed[profile.name] = observed + SKIPPED_DECAY * (prior - observed)
+
+    def select(
+        self,
+        requested: Optional[str],
+        default: str,
+        deadline_ms: Optional[float] = None,
+        queued: int = 0,
+    ) -> RecognitionProfile:
+        """
+        Pick the profile for a request.
+        Without a deadline the requested (or default) profile is used. With
+        a deadline, that profile is the upper bound and the most accurate
+        profile whose estimate fits - counting `queued` requests ahead of
+        this one - is chosen, falling back to the cheapest.
+        """
+        ceiling = self.get(requested or default)
+        if deadline_ms is None:
+            return ceiling
+
+        budget = deadline_ms / 1000
+        candidates = [p for p in self._ordered if p.estimated_ms <= ceiling.estimated_ms]
+        selected = candidates[0]
+        for profile in reversed(candidates):
+            if self.estimate(profile) * (1 + queued) <= budget:
+                selected = profile
+                break
+        self._decay_skipped(candidates, selected)
+        return selected
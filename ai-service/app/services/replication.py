@@ -0,0 +1,130 @@
+"""
+Gallery Replication
+Follower that pulls change feed deltas from a leader node and applies
+them to the local gallery without a full reload
+"""
+
+import time
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+import httpx
+
+from app.core.metrics import metrics
+
+
+class ReplicationFollower:
+    """
+    Polls the leader's /api/changes endpoint and applies deltas.
+
+    The leader's sequence numbers restart with each leader process (new
+    epoch). When the epoch changes the follower re-reads the feed from 0
+    and afterwards drops local users the leader no longer has. The feed is
+    not persisted, so this replay transfers and rewrites the whole gallery
+    after every leader restart.
+    """
+
+    def __init__(
+        self,
+        service,
+        leader_url: str,
+        api_key: Optional[str] = None,
+        poll_interval: float = 2.0,
+        page_size: int = 500,
+    ):
+        self.service = service
+        self.leader_url = leader_url.rstrip("/")
+        self.api_key = api_key
+        self.poll_interval = poll_interval
+        self.page_size = page_size
+
+        self.epoch: Optional[str] = None
+        self.version = 0
+        self.last_sync: Optional[float] = None
+        self._resync_seen: Optional[Set[str]] = None
+        self._task: Optional[asyncio.Task] = None
+
+        metrics.register_gauge(
+            "face_replication_leader_version",
+            "Leader change feed version applied by this follower",
+            lambda: self.version,
+        )
+        metrics.register_gauge(
+            "face_replication_last_sync_timestamp",
+            "Unix time of the last successful sync with the leader",
+            lambda: self.last_sync or 0,
+        )
+
+    async def _fetch(self, client: httpx.AsyncClient, since: int) -> Dict[str, Any]:
+        headers = {"X-API-Key": self.api_key} if self.api_key else {}
+        response = await client.get(
+            f"{self.leader_url}/api/changes",
+            params={"since": since, "limit": self.page_size},
+            headers=headers,
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def sync_once(self, client: httpx.AsyncClient) -> int:
+        """Pull and apply all pending changes. Returns the number applied."""
+        applied = 0
+
+        while True:
+            page = await self._fetch(client, self.version)
+
+            if page["epoch"] != self.epoch:
+                # Leader restarted (or first sync): replay its feed from the start
+                print(f"🔄 Replication: full resync from leader epoch {page['epoch'][:8]}")
+                self.epoch = page["epoch"]
+                self.version = 0
+                self._resync_seen = set()
+                if page["since"] != 0:
+                    continue
+
+            for change in page["changes"]:
+                await self.service.apply_change(change)
+                if self._resync_seen is not None and change["op"] == "put":
+                    self._resync_seen.add(change["user_id"])
+                applied += 1
+
+            self.version = page["version"]
+            if not page["has_more"]:
+                break
+
+        if self._resync_seen is not None:
+            # Users missing from a full replay were deleted while we were out of sync
+            for user_id in self.service.enrolled_user_ids():
+                if user_id not in self._resync_seen:
+                    await self.service.apply_change({"op": "delete", "user_id": user_id})
+                    applied += 1
+            self._resync_seen = None
+
+        self.last_sync = time.time()
+        return applied
+
+    async def run(self):
+        print(f"🔁 Replication: following {self.leader_url} every {self.poll_interval}s")
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            while True:
+                try:
+                    applied = await self.sync_once(client)
+                    if applied:
+                        print(f"🔁 Replication: applied {applied} changes (leader version {self.version})")
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Keep polling: a disk or data error on one change must not stop replication
+                    print(f"⚠️  Replication error ({type(e).__name__}): {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
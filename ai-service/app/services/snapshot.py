@@ -0,0 +1,233 @@
+"""
+Gallery Snapshots
+Single-file, checksummed, compressed gallery snapshots (full or
+incremental) and streaming restore straight into an encoding matrix
+
+File layout:
+    magic (8) | header length (uint32) | header JSON
+    | zlib payload | payload length (uint64) | sha256 of everything before (32)
+
+The decompressed payload is:
+    meta length (uint32) | meta JSON (users, deleted) | float64 encoding matrix
+with users' encodings stored contiguously in the order listed in meta.
+"""
+
+import os
+import json
+import zlib
+import struct
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"FACESNAP"
+FORMAT_VERSION = 1
+SNAPSHOT_SUFFIX = ".snap"
+TRAILER = struct.Struct("<Q32s")
+CHUNK_SIZE = 1024 * 1024
+
+KIND_FULL = "full"
+KIND_INCREMENTAL = "incremental"
+
+
+class SnapshotError(Exception):
+    """Raised for unreadable, corrupt or unchainable snapshots"""
+
+
+def snapshot_filename(header: Dict[str, Any]) -> str:
+    created = header["created_at"].replace(":", "").replace("-", "").replace(".", "")
+    return f"gallery-{created}-{header['snapshot_id'][:8]}-{header['kind']}{SNAPSHOT_SUFFIX}"
+
+
+def write_snapshot(
+    path: str,
+    header: Dict[str, Any],
+    users: List[Tuple[str, int, Dict[str, Any]]],
+    deleted: List[str],
+    matrix: np.ndarray,
+    compression_level: int = 1,
+) -> Dict[str, Any]:
+    """
+    Write a snapshot atomically. `users` lists (user_id, encoding count,
+    metadata) in the same order as the rows of `matrix`.
+    Returns the header with payload size and checksum filled in.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype="<f8")
+    header = {
+        **header,
+        "format_version": FORMAT_VERSION,
+        "user_count": len(users),
+        "deleted_count": len(deleted),
+        "encoding_count": int(matrix.shape[0]),
+        "dim": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "dtype": "<f8",
+        "compression": "zlib",
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    meta = json.dumps({"users": users, "deleted": deleted}).encode("utf-8")
+
+    tmp_path = path + ".tmp"
+    digest = hashlib.sha256()
+    payload_length = 0
+
+    with open(tmp_path, "wb") as f:
+        def emit(data: bytes, payload: bool = True):
+            nonlocal payload_length
+            if data:
+                f.write(data)
+                digest.update(data)
+                if payload:
+                    payload_length += len(data)
+
+        emit(MAGIC + struct.pack("<I", len(header_bytes)) + header_bytes, payload=False)
+
+        compressor = zlib.compressobj(compression_level)
+        emit(compressor.compress(struct.pack("<I", len(meta)) + meta))
+        if matrix.size:
+            raw = memoryview(matrix).cast("B")
+            for offset in range(0, len(raw), CHUNK_SIZE):
+                emit(compressor.compress(raw[offset:offset + CHUNK_SIZE]))
+        emit(compressor.flush())
+
+        f.write(TRAILER.pack(payload_length, digest.digest()))
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+    return {**header, "payload_bytes": payload_length, "sha256": digest.hexdigest()}
+
+
+def _read_header(f) -> Tuple[Dict[str, Any], bytes]:
+    prefix = f.read(len(MAGIC) + 4)
+    if len(prefix) < len(MAGIC) + 4 or prefix[:len(MAGIC)] != MAGIC:
+        raise SnapshotError("Not a gallery snapshot")
+    (length,) = struct.unpack("<I", prefix[len(MAGIC):])
+    header_bytes = f.read(length)
+    try:
+        header = json.loads(header_bytes)
+    except ValueError:
+        raise SnapshotError("Corrupt snapshot header")
+    if header.get("format_version") != FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format version {header.get('format_version')}")
+    return header, prefix + header_bytes
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        return _read_header(f)[0]
+
+
+def read_snapshot(path: str) -> Tuple[Dict[str, Any], Dict[str, Any], np.ndarray]:
+    """
+    Stream a snapshot from disk, decompressing directly into a
+    preallocated encoding matrix. The checksum is verified before the
+    data is returned. Returns (header, meta, matrix).
+    """
+    digest = hashlib.sha256()
+
+    with open(path, "rb") as f:
+        header, raw_header = _read_header(f)
+        digest.update(raw_header)
+
+        payload_length = os.fstat(f.fileno()).st_size - f.tell() - TRAILER.size
+        if payload_length < 0:
+            raise SnapshotError("Truncated snapshot")
+
+        decompressor = zlib.decompressobj()
+        pending = bytearray()
+        meta: Optional[Dict[str, Any]] = None
+        matrix = np.empty((header["encoding_count"], header["dim"]), dtype="<f8")
+        target = memoryview(matrix).cast("B") if matrix.size else memoryview(bytearray())
+        filled = 0
+
+        def consume(data: bytes):
+            nonlocal meta, filled, pending
+            if meta is None:
+                pending += data
+                if len(pending) < 4:
+                    return
+                (meta_length,) = struct.unpack("<I", pending[:4])
+                if len(pending) < 4 + meta_length:
+                    return
+                meta = json.loads(bytes(pending[4:4 + meta_length]))
+                data = bytes(pending[4 + meta_length:])
+                pending = bytearray()
+            if filled + len(data) > len(target):
+                raise SnapshotError("Snapshot payload larger than declared")
+            target[filled:filled + len(data)] = data
+            filled += len(data)
+
+        remaining = payload_length
+        try:
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise SnapshotError("Truncated snapshot")
+                remaining -= len(chunk)
+                digest.update(chunk)
+                consume(decompressor.decompress(chunk))
+            consume(decompressor.flush())
+        except (zlib.error, ValueError) as e:
+            raise SnapshotError(f"Corrupt snapshot payload: {e}")
+
+        stored_length, stored_digest = TRAILER.unpack(f.read(TRAILER.size))
+
+    if stored_length != payload_length or stored_digest != digest.digest():
+        raise SnapshotError("Snapshot checksum mismatch")
+    if meta is None or filled != len(target):
+        raise SnapshotError("Snapshot payload incomplete")
+
+    return header, meta, matrix
+
+
+def find_restore_chain(directory: str, target: Optional[str] = None) -> List[str]:
+    """
+    Snapshot files to restore, in order: the latest full snapshot followed
+    by the incrementals built on it. With `target`, the chain ends at that
+    file (its full base is found by following parent ids).
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    headers: Dict[str, Dict[str, Any]] = {}
+    paths: Dict[str, str] = {}
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SNAPSHOT_SUFFIX):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            header = read_header(path)
+        except (OSError, SnapshotError):
+            continue
+        headers[header["snapshot_id"]] = header
+        paths[header["snapshot_id"]] = path
+
+    if target is not None:
+        target_path = os.path.join(directory, os.path.basename(target))
+        current = next((sid for sid, path in paths.items() if path == target_path), None)
+        if current is None:
+            raise SnapshotError(f"Snapshot {target} not found")
+        chain = []
+        while current is not None:
+            header = headers.get(current)
+            if header is None:
+                raise SnapshotError("Snapshot chain is missing a parent")
+            chain.append(paths[current])
+            current = header.get("parent_id") if header["kind"] == KIND_INCREMENTAL else None
+        return list(reversed(chain))
+
+    fulls = [h for h in headers.values() if h["kind"] == KIND_FULL]
+    if not fulls:
+        return []
+    current = max(fulls, key=lambda h: h["created_at"])
+    chain = [paths[current["snapshot_id"]]]
+    while True:
+        children = [
+            h for h in headers.values()
+            if h["kind"] == KIND_INCREMENTAL and h.get("parent_id") == current["snapshot_id"]
+        ]
+        if not children:
+            return chain
+        current = max(children, key=lambda h: h["created_at"])
+        chain.append(paths[current["snapshot_id"]])
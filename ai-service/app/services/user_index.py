@@ -0,0 +1,164 @@
+"""
+User Index
+Sorted views over enrolled-user metadata for cursor-paginated, filtered
+listing, with each user's JSON serialized once and reused
+"""
+
+import json
+import base64
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+def normalize_timestamp(value: str) -> str:
+    """
+    ISO 8601 timestamp in the naive local-time form stored in metadata,
+    so it can be compared with `updated_at` as a string
+    """
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed.isoformat()
+
+
+def encode_cursor(key: Tuple[str, ...]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str, length: int) -> Tuple[str, ...]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, list) or len(key) != length or not all(isinstance(part, str) for part in key):
+        raise ValueError("Cursor does not match the requested filters")
+    return tuple(key)
+
+
+class UserIndex:
+    """
+    Listing entries for all enrolled users.
+
+    Users are kept sorted by user_id, by (updated_at, user_id) and by
+    user_id within each scope, so a page starts with a binary search
+    instead of a scan of the whole gallery.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lines: Dict[str, bytes] = {}
+        self._by_id: List[str] = []
+        self._by_updated: List[Tuple[str, str]] = []
+        self._by_scope: Dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _entry(user_id: str, embedding_count: int, metadata: Dict[str, Any]) -> Dict[str, Any]:
+        return {"user_id": user_id, "embedding_count": embedding_count, **metadata}
+
+    @staticmethod
+    def _updated_key(entry: Dict[str, Any]) -> Tuple[str, str]:
+        updated = entry.get("updated_at") or entry.get("created_at") or ""
+        return str(updated), entry["user_id"]
+
+    def load(self, users: Iterable[Tuple[str, int, Dict[str, Any]]]):
+        """Replace the index with (user_id, embedding count, metadata) tuples"""
+        self._entries = {
+            user_id: self._entry(user_id, count, metadata)
+            for user_id, count, metadata in users
+        }
+        self._lines = {}
+        self._by_id = sorted(self._entries)
+        self._by_updated = sorted(self._updated_key(entry) for entry in self._entries.values())
+        self._by_scope = {}
+        for user_id in self._by_id:
+            scope = self._entries[user_id].get("scope")
+            if scope is not None:
+                self._by_scope.setdefault(str(scope), []).append(user_id)
+
+    def put(self, user_id: str, embedding_count: int, metadata: Dict[str, Any]):
+        self.remove(user_id)
+        entry = self._entry(user_id, embedding_count, metadata)
+        self._entries[user_id] = entry
+        insort(self._by_id, user_id)
+        insort(self._by_updated, self._updated_key(entry))
+        scope = entry.get("scope")
+        if scope is not None:
+            insort(self._by_scope.setdefault(str(scope), []), user_id)
+
+    def remove(self, user_id: str):
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return
+        self._lines.pop(user_id, None)
+        _remove_sorted(self._by_id, user_id)
+        _remove_sorted(self._by_updated, self._updated_key(entry))
+        scope = entry.get("scope")
+        if scope is not None:
+            members = self._by_scope[str(scope)]
+            _remove_sorted(members, user_id)
+            if not members:
+                del self._by_scope[str(scope)]
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(user_id)
+
+    def line(self, user_id: str) -> Optional[bytes]:
+        """The user's entry as compact JSON, serialized on first use"""
+        line = self._lines.get(user_id)
+        if line is None:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            line = json.dumps(entry, separators=(",", ":"), default=str).encode("utf-8")
+            self._lines[user_id] = line
+        return line
+
+    def page(
+        self,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        updated_since: Optional[str] = None,
+        scope: Optional[str] = None,
+        min_encodings: int = 0,
+    ) -> Tuple[List[str], Optional[str]]:
+        """
+        User ids of one page and the cursor for the next page (None on the
+        last page). Pages are ordered by user_id, or by (updated_at,
+        user_id) when `updated_since` is given.
+        """
+        if updated_since is not None:
+            keys: List[Any] = self._by_updated
+            start = bisect_left(keys, (normalize_timestamp(updated_since),))
+            if cursor:
+                start = max(start, bisect_right(keys, decode_cursor(cursor, 2)))
+        else:
+            keys = self._by_scope.get(scope, []) if scope is not None else self._by_id
+            start = bisect_right(keys, decode_cursor(cursor, 1)[0]) if cursor else 0
+
+        user_ids: List[str] = []
+        last_key: Optional[Tuple[str, ...]] = None
+        for position in range(start, len(keys)):
+            key = keys[position]
+            user_id = key[1] if updated_since is not None else key
+            entry = self._entries[user_id]
+            if scope is not None and str(entry.get("scope")) != scope:
+                continue
+            if entry["embedding_count"] < min_encodings:
+                continue
+            if limit is not None and len(user_ids) == limit:
+                # Another match exists, so the page is not the last one
+                return user_ids, encode_cursor(last_key)
+            user_ids.append(user_id)
+            last_key = key if updated_since is not None else (key,)
+
+        return user_ids, None
+
+
+def _remove_sorted(keys: List[Any], key: Any):
+    position = bisect_left(keys, key)
+    if position < len(keys) and keys[position] == key:
+        del keys[position]
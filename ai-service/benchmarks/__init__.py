@@ -0,0 +1 @@
+"""Benchmark suite for the face recognition service"""
@@ -0,0 +1,71 @@
+"""
+Compare two benchmark reports
+
+Usage (from ai-service/):
+    python -m benchmarks.compare baseline.json current.json
+"""
+
+import sys
+import json
+import argparse
+from typing import Any, Dict, List, Optional
+
+
+def flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Flatten nested dicts to dotted keys, keeping numeric leaves"""
+    flat: Dict[str, float] = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = float(value)
+    return flat
+
+
+def index_results(report: Dict[str, Any]) -> Dict[int, Dict[str, float]]:
+    return {result["gallery_users"]: flatten(result) for result in report.get("results", [])}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> List[str]:
+    lines = []
+    base_results = index_results(baseline)
+    current_results = index_results(current)
+
+    for size in sorted(set(base_results) & set(current_results)):
+        lines.append(f"== gallery_users={size} ==")
+        base, cur = base_results[size], current_results[size]
+        for key in sorted(set(base) & set(cur)):
+            if not key.endswith(("_ms", "_rps")):
+                continue
+            before, after = base[key], cur[key]
+            change = ((after - before) / before * 100) if before else 0.0
+            marker = "  "
+            if abs(change) >= threshold:
+                marker = "▲ " if change > 0 else "▼ "
+            lines.append(f"{marker}{key:<45} {before:>12.3f} -> {after:>12.3f} ({change:+.1f}%)")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Diff two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Percent change to highlight")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"baseline: {baseline['meta'].get('git_revision')} ({baseline['meta'].get('backend')})")
+    print(f"current:  {current['meta'].get('git_revision')} ({current['meta'].get('backend')})")
+    for line in compare(baseline, current, args.threshold):
+        print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+Synthetic gallery generation
+Writes galleries in the same on-disk layout FaceRecognitionService loads
+"""
+
+import os
+import pickle
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+
+from benchmarks.stub_face_recognition import ENCODING_SCALE, ENCODING_SIZE
+
+USER_ID_PREFIX = "bench_user_"
+
+
+def generate_gallery(
+    path: str,
+    user_count: int,
+    encodings_per_user: int = 3,
+    seed: int = 0,
+    target_encoding: Optional[np.ndarray] = None,
+) -> int:
+    """
+    Write `user_count` synthetic users to `path`.
+    If `target_encoding` is given it is planted as the first user's
+    encoding so match queries have a known correct answer.
+    Returns the total number of encodings written.
+    """
+    os.makedirs(path, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    timestamp = datetime(2024, 1, 1).isoformat()
+    total = 0
+    
+    for index in range(user_count):
+        user_id = f"{USER_ID_PREFIX}{index:06d}"
+        encodings = list(rng.normal(0.0, ENCODING_SCALE, (encodings_per_user, ENCODING_SIZE)))
+        if index == 0 and target_encoding is not None:
+            encodings[0] = target_encoding.copy()
+        
+        data = {
+            'encodings': encodings,
+            'metadata': {
+                "created_at": timestamp,
+                "updated_at": timestamp,
+                "encoding_count": len(encodings),
+            },
+        }
+        with open(os.path.join(path, f"{user_id}.pkl"), 'wb') as f:
+            pickle.dump(data, f)
+        total += len(encodings)
+    
+    return total
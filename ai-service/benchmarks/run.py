@@ -0,0 +1,320 @@
+"""
+Face recognition benchmark runner
+
+Measures gallery load time, match latency, enrollment I/O and end-to-end
+HTTP throughput against synthetic galleries, and writes a JSON report.
+
+Usage (from ai-service/):
+    python -m benchmarks.run --sizes 1000 10000 100000 --output report.json
+    python -m benchmarks.run --real-dlib --image face.jpg
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import base64
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from io import BytesIO
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+from benchmarks import stub_face_recognition
+from benchmarks.gallery import generate_gallery, USER_ID_PREFIX
+
+
+# ============ Helpers ============
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    values = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def synthetic_image_base64(seed: int, width: int = 640, height: int = 480) -> str:
+    """Deterministic JPEG image as base64"""
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def file_image_base64(path: str) -> str:
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ============ Benchmarks ============
+
+def bench_load(service_cls, repeats: int) -> Dict[str, Any]:
+    """Time service construction (directory scan + unpickling)"""
+    samples = []
+    service = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        service = service_cls()
+        samples.append(time.perf_counter() - start)
+    return {"latency": summarize(samples), "service": service}
+
+
+async def bench_search(service, query_base64: str, iterations: int, profile: Optional[str] = None) -> Dict[str, Any]:
+    """Time match_face and break it down by pipeline stage"""
+    from app.core.metrics import start_request_timing
+
+    samples = []
+    stages: Dict[str, List[float]] = {}
+    correct = 0
+
+    for _ in range(iterations):
+        timings = start_request_timing()
+        start = time.perf_counter()
+        result = await service.match_face(query_base64, profile=profile)
+        samples.append(time.perf_counter() - start)
+
+        for stage, duration in timings:
+            stages.setdefault(stage, []).append(duration)
+        best = result.get("best_match")
+        if best and best["user_id"] == f"{USER_ID_PREFIX}000000":
+            correct += 1
+
+    return {
+        "latency": summarize(samples),
+        "stages": {stage: summarize(values) for stage, values in sorted(stages.items())},
+        "correct_matches": correct,
+    }
+
+
+async def bench_enroll(service, images_base64: List[str], profile: Optional[str] = None) -> Dict[str, Any]:
+    """Time encode_face for new users, including persistence"""
+    from app.core.metrics import start_request_timing
+
+    samples = []
+    persistence = []
+    failures = 0
+
+    for index, image_base64 in enumerate(images_base64):
+        timings = start_request_timing()
+        start = time.perf_counter()
+        result = await service.encode_face(image_base64, f"bench_enroll_{index:06d}", profile=profile)
+        samples.append(time.perf_counter() - start)
+
+        persistence.extend(d for stage, d in timings if stage == "persistence")
+        if not result["success"]:
+            failures += 1
+
+    return {
+        "latency": summarize(samples),
+        "persistence": summarize(persistence),
+        "failures": failures,
+    }
+
+
+async def bench_http(query_base64: str, total_requests: int, concurrency: int, profile: Optional[str] = None) -> Dict[str, Any]:
+    """Drive POST /api/match through the full FastAPI app with concurrent clients"""
+    import httpx
+    from app.main import app
+
+    payload = {"image_base64": query_base64, "profile": profile}
+    samples: List[float] = []
+    errors = 0
+    remaining = total_requests
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            response = await client.post("/api/match", json=payload)
+            samples.append(time.perf_counter() - start)
+            if response.status_code != 200 or not response.json().get("success"):
+                errors += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "latency": summarize(samples),
+    }
+
+
+def run_size(args, workdir: str, user_count: int, query_base64: str, target_encoding: np.ndarray) -> Dict[str, Any]:
+    from app.core.config import settings
+    from app.services.face_service import FaceRecognitionService
+    from app.api import face_routes
+
+    gallery_path = os.path.join(workdir, f"gallery_{user_count}")
+    encoding_count = generate_gallery(
+        gallery_path,
+        user_count,
+        encodings_per_user=args.encodings_per_user,
+        seed=args.seed,
+        target_encoding=target_encoding,
+    )
+    settings.FACE_ENCODINGS_PATH = gallery_path
+
+    load = bench_load(FaceRecognitionService, args.load_repeats)
+    service = load.pop("service")
+
+    search = asyncio.run(bench_search(service, query_base64, args.search_iterations, args.profile))
+
+    # HTTP runs against the loaded gallery before enrollment grows it
+    face_routes.face_service = service
+    http = asyncio.run(bench_http(query_base64, args.http_requests, args.concurrency, args.profile))
+
+    enroll_images = [
+        synthetic_image_base64(args.seed + 1000 + i, args.image_width, args.image_height)
+        for i in range(args.enroll_count)
+    ]
+    enroll = asyncio.run(bench_enroll(service, enroll_images, args.enroll_profile))
+
+    return {
+        "gallery_users": user_count,
+        "gallery_encodings": encoding_count,
+        "load": load,
+        "search": search,
+        "enroll": enroll,
+        "http": http,
+    }
+
+
+# ============ CLI ============
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the face recognition service")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="Gallery sizes (users) to benchmark")
+    parser.add_argument("--encodings-per-user", type=int, default=3)
+    parser.add_argument("--search-iterations", type=int, default=50)
+    parser.add_argument("--load-repeats", type=int, default=3)
+    parser.add_argument("--enroll-count", type=int, default=100)
+    parser.add_argument("--http-requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--image-width", type=int, default=640)
+    parser.add_argument("--image-height", type=int, default=480)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--profile", help="Recognition profile for match requests")
+    parser.add_argument("--enroll-profile", help="Recognition profile for enrollment")
+    parser.add_argument("--stub-detect-ms", type=float, default=0.0,
+                        help="Simulated detection cost per call for the stub backend")
+    parser.add_argument("--stub-encode-ms", type=float, default=0.0,
+                        help="Simulated encoding cost per face for the stub backend")
+    parser.add_argument("--real-dlib", action="store_true",
+                        help="Use the real face_recognition library instead of the stub")
+    parser.add_argument("--image", help="Query image with a real face (required with --real-dlib)")
+    parser.add_argument("--output", default="benchmark-report.json", help="JSON report path")
+    parser.add_argument("--keep", action="store_true", help="Keep generated galleries")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+
+    if args.real_dlib and not args.image:
+        print("--real-dlib requires --image with a detectable face", file=sys.stderr)
+        return 2
+
+    # Settings are read at import time, so point storage at the workdir first
+    workdir = tempfile.mkdtemp(prefix="face-bench-")
+    os.environ["FACE_ENCODINGS_PATH"] = os.path.join(workdir, "default")
+    os.environ["TEMP_UPLOAD_PATH"] = os.path.join(workdir, "temp")
+
+    if args.real_dlib:
+        import face_recognition as backend
+        backend_name = "dlib"
+    else:
+        stub_face_recognition.install()
+        stub_face_recognition.DETECT_DELAY = args.stub_detect_ms / 1000
+        stub_face_recognition.ENCODE_DELAY = args.stub_encode_ms / 1000
+        backend = stub_face_recognition
+        backend_name = "stub"
+
+    from app.services import face_service
+
+    if args.image:
+        query_base64 = file_image_base64(args.image)
+    else:
+        query_base64 = synthetic_image_base64(args.seed, args.image_width, args.image_height)
+
+    # Plant the query's own encoding so every search has a known answer
+    query_array = np.array(Image.open(BytesIO(base64.b64decode(query_base64))).convert("RGB"))
+    target_encodings = backend.face_encodings(query_array, backend.face_locations(query_array))
+    if not target_encodings:
+        print("No face detected in query image", file=sys.stderr)
+        return 2
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": git_revision(),
+            "backend": backend_name,
+            "face_recognition_available": face_service.FACE_RECOGNITION_AVAILABLE,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "parameters": {
+                key: value for key, value in vars(args).items()
+                if key not in ("output", "keep")
+            },
+        },
+        "results": [],
+    }
+
+    try:
+        for user_count in args.sizes:
+            print(f"⏱️  Benchmarking gallery of {user_count} users ({backend_name})...")
+            result = run_size(args, workdir, user_count, query_base64, target_encodings[0])
+            report["results"].append(result)
+            print(
+                f"   load p50={result['load']['latency']['p50_ms']}ms "
+                f"match p50={result['search']['latency']['p50_ms']}ms "
+                f"enroll p50={result['enroll']['latency']['p50_ms']}ms "
+                f"http={result['http']['throughput_rps']} req/s"
+            )
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"📄 Report written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+Deterministic stand-in for the face_recognition library
+Lets benchmarks run on machines without dlib. Detection always returns a
+single centered face box and encodings are derived from a hash of the
+image pixels, so the same image always yields the same encoding.
+"""
+
+import sys
+import time
+import hashlib
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Optional simulated per-call cost (seconds) to approximate dlib timings
+DETECT_DELAY = 0.0
+ENCODE_DELAY = 0.0
+
+# Spread of generated encodings; dlib encodings have a similar magnitude
+ENCODING_SCALE = 0.09
+ENCODING_SIZE = 128
+
+
+def encoding_for_seed(seed: int) -> np.ndarray:
+    """Deterministic 128-d encoding for an integer seed"""
+    rng = np.random.default_rng(seed)
+    return rng.normal(0.0, ENCODING_SCALE, ENCODING_SIZE)
+
+
+def encoding_for_image(image: np.ndarray) -> np.ndarray:
+    """Deterministic encoding derived from image pixels"""
+    digest = hashlib.blake2b(np.ascontiguousarray(image).tobytes(), digest_size=8).digest()
+    return encoding_for_seed(int.from_bytes(digest, "little"))
+
+
+def _centered_box(img: np.ndarray) -> Tuple[int, int, int, int]:
+    """Face box covering the middle of the image (top, right, bottom, left)"""
+    height, width = img.shape[:2]
+    return (height // 4, width * 3 // 4, height * 3 // 4, width // 4)
+
+
+def face_locations(img: np.ndarray, number_of_times_to_upsample: int = 1, model: str = "hog") -> List[Tuple[int, int, int, int]]:
+    """Return a single centered face box"""
+    if DETECT_DELAY:
+        time.sleep(DETECT_DELAY * number_of_times_to_upsample)
+    return [_centered_box(img)]
+
+
+def face_encodings(face_image: np.ndarray, known_face_locations=None, num_jitters: int = 1, model: str = "small") -> List[np.ndarray]:
+    """Return one deterministic encoding per face location"""
+    locations = known_face_locations or [_centered_box(face_image)]
+    if ENCODE_DELAY:
+        time.sleep(ENCODE_DELAY * num_jitters * len(locations))
+    encoding = encoding_for_image(face_image)
+    return [encoding.copy() for _ in locations]
+
+
+def face_landmarks(face_image: np.ndarray, face_locations=None, model: str = "large") -> List[Dict[str, List[Tuple[int, int]]]]:
+    """Frontal 5-point landmarks placed inside each face box"""
+    locations = face_locations or [_centered_box(face_image)]
+    landmarks = []
+    for top, right, bottom, left in locations:
+        width, height = right - left, bottom - top
+        eye_y = top + height * 2 // 5
+        landmarks.append({
+            "left_eye": [(left + width // 5, eye_y), (left + width * 2 // 5, eye_y)],
+            "right_eye": [(left + width * 3 // 5, eye_y), (left + width * 4 // 5, eye_y)],
+            "nose_tip": [(left + width // 2, top + height * 3 // 5)],
+        })
+    return landmarks
+
+
+def face_distance(face_encodings, face_to_compare: np.ndarray) -> np.ndarray:
+    """Euclidean distance, identical to face_recognition.face_distance"""
+    if len(face_encodings) == 0:
+        return np.empty((0))
+    return np.linalg.norm(np.asarray(face_encodings) - face_to_compare, axis=1)
+
+
+def install():
+    """
+    Register this module as `face_recognition`.
+    Must run before app.services.face_service is imported.
+    """
+    sys.modules["face_recognition"] = sys.modules[__name__]
@@ -0,0 +1,45 @@
+"""
+Shared fixtures. Storage paths point at a throwaway directory and the
+benchmark stub stands in for face_recognition (no dlib needed); both must
+be set up before the app is imported, since face_routes builds its
+service at import time.
+"""
+
+import os
+import tempfile
+
+_DATA_DIR = tempfile.mkdtemp(prefix="ai-service-tests-")
+os.environ.setdefault("FACE_ENCODINGS_PATH", os.path.join(_DATA_DIR, "encodings"))
+os.environ.setdefault("TEMP_UPLOAD_PATH", os.path.join(_DATA_DIR, "temp"))
+os.environ.setdefault("SNAPSHOT_PATH", os.path.join(_DATA_DIR, "snapshots"))
+
+from benchmarks import stub_face_recognition
+
+stub_face_recognition.install()
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services.face_service import FaceRecognitionService
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """A FaceRecognitionService with its own empty storage directories"""
+    monkeypatch.setattr(settings, "FACE_ENCODINGS_PATH", str(tmp_path / "encodings"))
+    monkeypatch.setattr(settings, "TEMP_UPLOAD_PATH", str(tmp_path / "temp"))
+    monkeypatch.setattr(settings, "SNAPSHOT_PATH", str(tmp_path / "snapshots"))
+    return FaceRecognitionService()
+
+
+@pytest.fixture
+def enroll():
+    """Store random encodings for a user without running face detection"""
+    def _enroll(service: FaceRecognitionService, user_id: str, count: int = 2, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        service._encodings_cache[user_id] = [rng.normal(size=128) * 0.1 for _ in range(count)]
+        service._user_metadata[user_id] = {"created_at": "2026-01-01T00:00:00", "encoding_count": count}
+        service._save_user_encodings(user_id)
+        service._record_change(user_id)
+    return _enroll
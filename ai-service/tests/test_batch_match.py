@@ -0,0 +1,67 @@
+"""Micro-batched gallery search in FaceRecognitionService.match_batch"""
+
+import asyncio
+import time
+from io import BytesIO
+
+from PIL import Image
+
+from app.core.config import settings
+from benchmarks import stub_face_recognition
+
+
+def image_bytes(shade: int) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), (shade, 100, 100)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def run_batch(service, items):
+    async def run():
+        stamped = []
+        async for result in service.match_batch(items()):
+            stamped.append((time.perf_counter(), result))
+        return stamped
+    return asyncio.run(run())
+
+
+def test_encoded_images_are_searched_in_micro_batches(service, monkeypatch):
+    monkeypatch.setattr(settings, "QUALITY_GATE_ENABLED", False)
+    # Workers finish one at a time, as with real dlib timings
+    monkeypatch.setattr(stub_face_recognition, "ENCODE_DELAY", 0.003)
+    searches = []
+    search = service._search_gallery
+
+    def recording_search(queries):
+        searches.append(len(queries))
+        return search(queries)
+
+    monkeypatch.setattr(service, "_search_gallery", recording_search)
+
+    async def items():
+        for index in range(32):
+            yield {"index": index, "id": str(index), "image": image_bytes(index)}
+
+    results = [result for _, result in run_batch(service, items)]
+
+    assert sorted(result["index"] for result in results[:-1]) == list(range(32))
+    assert results[-1]["processed"] == 32
+    assert sum(searches) == 32
+    assert len(searches) <= 16
+
+
+def test_results_are_not_held_back_by_a_stalled_upload(service, monkeypatch):
+    monkeypatch.setattr(settings, "QUALITY_GATE_ENABLED", False)
+    async def items():
+        yield {"index": 0, "id": "0", "image": image_bytes(0)}
+        yield {"index": 1, "id": "1", "image": image_bytes(1)}
+        await asyncio.sleep(0.5)
+        yield {"index": 2, "id": "2", "image": image_bytes(2)}
+
+    start = time.perf_counter()
+    stamped = run_batch(service, items)
+
+    first_two = [at for at, result in stamped if result.get("index") in (0, 1)]
+    assert len(first_two) == 2
+    assert max(first_two) - start < 0.4
+    assert stamped[-1][1]["processed"] == 3
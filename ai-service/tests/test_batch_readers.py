@@ -0,0 +1,163 @@
+"""Streaming batch input readers and /api/match-batch error handling"""
+
+import asyncio
+import base64
+import json
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from multipart.exceptions import MultipartParseError
+from PIL import Image
+from starlette.requests import Request
+
+from app.api import face_routes
+from app.main import app
+
+BOUNDARY = "testboundary"
+
+
+def make_request(chunks, content_type):
+    """Request whose body arrives in the given chunks"""
+    chunks = list(chunks)
+
+    async def receive():
+        if chunks:
+            return {"type": "http.request", "body": chunks.pop(0), "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/match-batch",
+        "headers": [(b"content-type", content_type.encode())],
+    }
+    return Request(scope, receive)
+
+
+def collect(iterator):
+    async def run():
+        return [item async for item in iterator]
+    return asyncio.run(run())
+
+
+def multipart_body(parts, closed=True):
+    body = b""
+    for name, data in parts:
+        body += (
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="images"; filename="{name}"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode() + data + b"\r\n"
+    if closed:
+        body += f"--{BOUNDARY}--\r\n".encode()
+    return body
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def jpeg_bytes():
+    buffer = BytesIO()
+    Image.new("RGB", (64, 64), (120, 110, 100)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+# ============ NDJSON ============
+
+def test_ndjson_lines_split_across_chunks():
+    body = b'{"id": "a", "image_base64": "AAA"}\n\nnot json\n{"image_base64": "BBB"}'
+    request = make_request(split(body, 7), "application/x-ndjson")
+
+    items = collect(face_routes.iter_ndjson_images(request))
+
+    assert items[0] == {"index": 0, "id": "a", "image": "AAA"}
+    assert items[1]["index"] == 1 and "error" in items[1]
+    assert items[2] == {"index": 2, "id": None, "image": "BBB"}
+
+
+def test_ndjson_oversized_line_is_skipped(monkeypatch):
+    monkeypatch.setattr(face_routes, "MAX_NDJSON_LINE", 64)
+    huge = json.dumps({"id": "big", "image_base64": "A" * 500}).encode()
+    body = huge + b'\n{"id": "ok", "image_base64": "AAA"}\n'
+    request = make_request(split(body, 32), "application/x-ndjson")
+
+    items = collect(face_routes.iter_ndjson_images(request))
+
+    assert len(items) == 2
+    assert items[0]["index"] == 0 and "too large" in items[0]["error"]
+    assert items[1] == {"index": 1, "id": "ok", "image": "AAA"}
+
+
+# ============ Multipart ============
+
+def test_multipart_parts_split_across_chunks():
+    body = multipart_body([("one.jpg", b"\x00" * 300), ("two.jpg", b"\x01" * 10)])
+    request = make_request(split(body, 50), f"multipart/form-data; boundary={BOUNDARY}")
+
+    items = collect(face_routes.iter_multipart_images(request, BOUNDARY.encode()))
+
+    assert [(item["index"], item["id"], item["image"]) for item in items] == [
+        (0, "one.jpg", b"\x00" * 300),
+        (1, "two.jpg", b"\x01" * 10),
+    ]
+
+
+def test_multipart_oversized_part_is_reported(monkeypatch):
+    monkeypatch.setattr(face_routes, "MAX_FILE_SIZE", 100)
+    body = multipart_body([("big.jpg", b"\x00" * 500), ("small.jpg", b"\x01" * 20)])
+    request = make_request(split(body, 64), f"multipart/form-data; boundary={BOUNDARY}")
+
+    items = collect(face_routes.iter_multipart_images(request, BOUNDARY.encode()))
+
+    assert items[0]["id"] == "big.jpg" and "too large" in items[0]["error"]
+    assert items[1]["image"] == b"\x01" * 20
+
+
+def test_multipart_truncated_body_raises():
+    body = multipart_body([("one.jpg", b"\x00" * 10), ("two.jpg", b"\x01" * 10)], closed=False)
+    request = make_request([body[:-20]], f"multipart/form-data; boundary={BOUNDARY}")
+
+    with pytest.raises(MultipartParseError):
+        collect(face_routes.iter_multipart_images(request, BOUNDARY.encode()))
+
+
+# ============ Endpoint ============
+
+def test_match_batch_requires_boundary():
+    client = TestClient(app)
+    response = client.post(
+        "/api/match-batch", content=b"x", headers={"Content-Type": "multipart/form-data"},
+    )
+    assert response.status_code == 400
+
+
+def test_match_batch_malformed_multipart_ends_with_failed_summary():
+    client = TestClient(app)
+    body = multipart_body([("one.jpg", jpeg_bytes())]) + b"garbage"
+    body = body.replace(b"Content-Disposition", b"\x00bad header", 1)
+
+    response = client.post(
+        "/api/match-batch",
+        content=body,
+        headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"},
+    )
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert response.status_code == 200
+    assert lines[-1]["done"] is True and lines[-1]["success"] is False
+
+
+def test_match_batch_ndjson_summary():
+    client = TestClient(app)
+    image = base64.b64encode(jpeg_bytes()).decode()
+    body = "\n".join(json.dumps({"id": str(i), "image_base64": image}) for i in range(3))
+
+    response = client.post(
+        "/api/match-batch", content=body, headers={"Content-Type": "application/x-ndjson"},
+    )
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+    assert lines[-1] == {"done": True, "processed": 3, "matched": 0, "message": "Processed 3 images, 0 matched"}
@@ -0,0 +1,67 @@
+"""Deadline-aware recognition profile selection"""
+
+import asyncio
+
+import pytest
+
+from app.core.metrics import ServerTimingMiddleware, metrics
+
+
+def test_non_recognition_traffic_does_not_downgrade(service, monkeypatch):
+    # A long profile call, a batch stream and a metrics scrape are in flight
+    monkeypatch.setattr(metrics, "inflight_requests", 4)
+    monkeypatch.setattr(metrics, "inflight_recognition", 1)  # this request
+
+    selected = service._select_profile(None, 300, "balanced")
+
+    assert selected.name == "balanced"
+
+
+def test_queued_recognition_requests_downgrade(service, monkeypatch):
+    monkeypatch.setattr(metrics, "inflight_recognition", 3)
+
+    selected = service._select_profile(None, 300, "balanced")
+
+    assert selected.name == "fast"
+
+
+def test_middleware_counts_only_recognition_paths(monkeypatch):
+    monkeypatch.setattr(metrics, "inflight_requests", 0)
+    monkeypatch.setattr(metrics, "inflight_recognition", 0)
+    seen = {}
+
+    async def app(scope, receive, send):
+        seen[scope["path"]] = (metrics.inflight_requests, metrics.inflight_recognition)
+
+    middleware = ServerTimingMiddleware(app, recognition_paths=["/api/match"])
+
+    async def call(path):
+        await middleware({"type": "http", "path": path}, None, None)
+
+    asyncio.run(call("/api/match"))
+    asyncio.run(call("/api/admin/profile/cpu"))
+
+    assert seen == {"/api/match": (1, 1), "/api/admin/profile/cpu": (1, 0)}
+    assert metrics.inflight_recognition == 0
+
+
+def test_first_sample_is_averaged_with_the_configured_estimate(service):
+    balanced = service.profiles.get("balanced")
+
+    service.profiles.record(balanced, 5.0)
+
+    prior = balanced.estimated_ms / 1000
+    assert service.profiles.estimate(balanced) == pytest.approx(prior + 0.2 * (5.0 - prior))
+
+
+def test_skipped_profile_is_retried_after_a_slow_spike(service, monkeypatch):
+    monkeypatch.setattr(metrics, "inflight_recognition", 1)
+    balanced = service.profiles.get("balanced")
+    for _ in range(20):
+        service.profiles.record(balanced, 5.0)
+    deadline_ms = 2 * balanced.estimated_ms
+
+    assert service._select_profile(None, deadline_ms, "balanced").name == "fast"
+
+    selected = [service._select_profile(None, deadline_ms, "balanced").name for _ in range(200)]
+    assert "balanced" in selected
@@ -0,0 +1,42 @@
+"""On-demand CPU sampling"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core import profiling
+
+
+def spin(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_cpu_sampler_skips_waiting_threads():
+    stop = threading.Event()
+    items = queue.Queue()
+    workers = [
+        threading.Thread(target=spin, args=(stop,), name="busy"),
+        threading.Thread(target=stop.wait, name="event-wait"),
+        threading.Thread(target=items.get, name="queue-get"),
+    ]
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="idle-pool")
+    pool.submit(lambda: None).result()
+    for worker in workers:
+        worker.start()
+
+    sampler = profiling.CpuSampler(interval=0.005)
+    sampler.start()
+    time.sleep(0.2)
+    sampler.stop()
+    stop.set()
+    items.put(None)
+    pool.shutdown()
+    for worker in workers:
+        worker.join()
+
+    roots = {line.split(";", 1)[0] for line in sampler.collapsed().splitlines()}
+    assert "busy" in roots
+    assert not roots & {"event-wait", "queue-get", "idle-pool_0"}
+    assert sampler.idle >= 3 * sampler.samples // 2
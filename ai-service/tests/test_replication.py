@@ -0,0 +1,97 @@
+"""Replication follower polling loop and follower-side writes"""
+
+import asyncio
+import base64
+import os
+import threading
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.services.replication import ReplicationFollower
+
+
+class FlakyService:
+    """Gallery whose first apply_change fails like a full disk"""
+
+    def __init__(self):
+        self.applied = []
+
+    async def apply_change(self, change):
+        if not self.applied:
+            self.applied.append(None)
+            raise OSError("No space left on device")
+        self.applied.append(change["user_id"])
+
+    def enrolled_user_ids(self):
+        return [user_id for user_id in self.applied if user_id]
+
+
+def test_follower_keeps_polling_after_unexpected_errors(monkeypatch):
+    follower = ReplicationFollower(FlakyService(), "http://leader", poll_interval=0)
+    page = {
+        "epoch": "e1", "since": 0, "version": 1, "has_more": False,
+        "changes": [{"seq": 1, "op": "put", "user_id": "a", "encodings": [], "metadata": {}}],
+    }
+    calls = []
+
+    async def fetch(client, since):
+        calls.append(since)
+        if len(calls) == 2:
+            raise TypeError("malformed change")
+        return page
+
+    monkeypatch.setattr(follower, "_fetch", fetch)
+
+    async def polled_four_times():
+        while len(calls) < 4:
+            await asyncio.sleep(0.01)
+
+    async def run():
+        task = asyncio.create_task(follower.run())
+        try:
+            # A follower task that died would never poll again; fail instead of hanging
+            await asyncio.wait_for(polled_four_times(), timeout=5)
+        finally:
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    # Both the OSError and the TypeError were survived and a later poll succeeded
+    assert len(calls) >= 4
+    assert "a" in follower.service.applied
+    assert follower.version == 1 and follower.last_sync is not None
+
+
+def test_apply_change_writes_off_the_event_loop(service, monkeypatch):
+    writer_threads = []
+    write = service._write_user_file
+
+    def recording_write(user_id, data):
+        writer_threads.append(threading.current_thread() is threading.main_thread())
+        return write(user_id, data)
+
+    monkeypatch.setattr(service, "_write_user_file", recording_write)
+    encoding = base64.b64encode(np.ones(128).tobytes()).decode()
+
+    asyncio.run(service.apply_change({"op": "put", "user_id": "a", "encodings": [encoding], "metadata": {}}))
+    asyncio.run(service.apply_change({"op": "delete", "user_id": "b"}))
+
+    assert writer_threads == [False, False]
+    assert service.enrolled_user_ids() == ["a"]
+    assert os.path.exists(service._get_user_filepath("a"))
+
+
+def test_follower_rejects_local_writes(monkeypatch):
+    monkeypatch.setattr(settings, "REPLICATION_LEADER_URL", "http://leader")
+    client = TestClient(app)
+
+    assert client.post("/api/encode", json={"image_base64": "", "user_id": "a"}).status_code == 409
+    assert client.post("/api/train", json={"user_id": "a", "images_base64": []}).status_code == 409
+    assert client.delete("/api/user/a").status_code == 409
+    assert client.get("/api/users").status_code == 200
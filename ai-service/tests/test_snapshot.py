@@ -0,0 +1,177 @@
+"""Gallery snapshot chains: writing, folding incrementals and restore"""
+
+import asyncio
+import os
+import pickle
+import time
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import snapshot
+from app.services.face_service import FaceRecognitionService
+
+
+def gallery(service):
+    return {user_id: np.array(encs) for user_id, encs in service._encodings_cache.items()}
+
+
+def assert_same_gallery(actual, expected):
+    assert set(actual) == set(expected)
+    for user_id, encodings in expected.items():
+        np.testing.assert_array_equal(actual[user_id], encodings)
+
+
+def test_restore_folds_incremental_chain(service, enroll):
+    for seed, user_id in enumerate(["a", "b", "c"]):
+        enroll(service, user_id, seed=seed)
+    full = asyncio.run(service.create_snapshot())
+
+    enroll(service, "d", seed=3)
+    enroll(service, "a", count=3, seed=4)
+    service._remove_user("b")
+    first = asyncio.run(service.create_snapshot(incremental=True))
+
+    enroll(service, "e", seed=5)
+    second = asyncio.run(service.create_snapshot(incremental=True))
+
+    assert first["kind"] == snapshot.KIND_INCREMENTAL
+    assert first["parent_id"] == full["snapshot_id"]
+    assert first["deleted_count"] == 1
+    assert second["parent_id"] == first["snapshot_id"]
+    assert second["user_count"] == 1
+
+    chain = snapshot.find_restore_chain(settings.SNAPSHOT_PATH)
+    assert [os.path.basename(path) for path in chain] == [full["file"], first["file"], second["file"]]
+
+    expected = gallery(service)
+    restored = FaceRecognitionService()
+    result = asyncio.run(restored.restore_snapshot())
+
+    assert result["user_count"] == 4
+    assert_same_gallery(gallery(restored), expected)
+    assert restored._gallery.search(expected["a"][2][None], 0.01)[0] == {"a": 0.0}
+
+
+def test_restore_up_to_named_snapshot(service, enroll):
+    enroll(service, "a")
+    full = asyncio.run(service.create_snapshot())
+    expected = gallery(service)
+    enroll(service, "b", seed=1)
+    asyncio.run(service.create_snapshot(incremental=True))
+
+    result = asyncio.run(service.restore_snapshot(full["file"]))
+
+    assert result["removed_users"] == 1
+    assert_same_gallery(gallery(service), expected)
+
+
+def test_overlapping_incremental_snapshots_keep_one_chain(service, enroll, monkeypatch):
+    for seed, user_id in enumerate(["a", "b", "c"]):
+        enroll(service, user_id, seed=seed)
+    asyncio.run(service.create_snapshot())
+
+    write = snapshot.write_snapshot
+    calls = []
+
+    def slow_first_write(*args, **kwargs):
+        calls.append(args[0])
+        if len(calls) == 1:
+            time.sleep(0.2)
+        return write(*args, **kwargs)
+
+    monkeypatch.setattr(snapshot, "write_snapshot", slow_first_write)
+
+    async def overlapping():
+        enroll(service, "x", seed=7)
+        slow = asyncio.create_task(service.create_snapshot(incremental=True))
+        await asyncio.sleep(0.05)
+        fast = asyncio.create_task(service.create_snapshot(incremental=True))
+        return await slow, await fast
+
+    slow, fast = asyncio.run(overlapping())
+    assert fast["parent_id"] == slow["snapshot_id"]
+
+    enroll(service, "d", seed=8)
+    asyncio.run(service.create_snapshot(incremental=True))
+    expected = gallery(service)
+
+    restored = FaceRecognitionService()
+    asyncio.run(restored.restore_snapshot())
+    assert_same_gallery(gallery(restored), expected)
+
+
+def test_corrupt_snapshot_is_rejected(service, enroll):
+    enroll(service, "a")
+    full = asyncio.run(service.create_snapshot())
+    path = os.path.join(settings.SNAPSHOT_PATH, full["file"])
+
+    data = bytearray(open(path, "rb").read())
+    data[len(data) // 2] ^= 0xFF
+    with open(path, "wb") as f:
+        f.write(data)
+
+    with pytest.raises(snapshot.SnapshotError):
+        snapshot.read_snapshot(path)
+
+
+def test_interrupted_restore_is_redone_on_startup(service, enroll, monkeypatch):
+    for seed, user_id in enumerate(["a", "b", "c"]):
+        enroll(service, user_id, seed=seed)
+    asyncio.run(service.create_snapshot())
+    expected = gallery(service)
+
+    # Fresh node: the pickle write for "b" fails part way through the restore
+    for filename in os.listdir(settings.FACE_ENCODINGS_PATH):
+        os.remove(os.path.join(settings.FACE_ENCODINGS_PATH, filename))
+    enroll(service, "stale", seed=9)
+    dump = pickle.dump
+
+    def failing_dump(data, f):
+        if f.name.endswith("b.pkl"):
+            raise OSError("disk full")
+        return dump(data, f)
+
+    monkeypatch.setattr(pickle, "dump", failing_dump)
+    result = asyncio.run(service.restore_snapshot())
+    monkeypatch.setattr(pickle, "dump", dump)
+
+    assert result["persisted"] is False
+    assert service._read_restore_marker() is not None
+    assert not os.path.exists(os.path.join(settings.FACE_ENCODINGS_PATH, "stale.pkl"))
+
+    # Pickles exist but are incomplete; the marker makes startup restore again
+    restarted = FaceRecognitionService()
+    restarted._persist_thread.join()
+    assert_same_gallery(gallery(restarted), expected)
+    assert restarted._read_restore_marker() is None
+
+    reloaded = FaceRecognitionService()
+    assert reloaded._persist_thread is None
+    assert_same_gallery(gallery(reloaded), expected)
+
+
+def test_restore_persistence_keeps_newer_enrollments(service, enroll):
+    for seed, user_id in enumerate(["a", "b"]):
+        enroll(service, user_id, seed=seed)
+    asyncio.run(service.create_snapshot())
+
+    restored = FaceRecognitionService()
+    chain = snapshot.find_restore_chain(settings.SNAPSHOT_PATH)
+    users, _ = restored._install_gallery(*restored._read_snapshot_chain(chain))
+    writes = restored._restore_writes(users)
+
+    # An enrollment lands on the loop before the restore thread writes "a"
+    restored._encodings_cache["a"].append(np.full(128, 0.5))
+    restored._user_metadata["a"]["scope"] = "new"
+    restored._save_user_encodings("a")
+
+    assert restored._persist_restored(writes) == 0
+
+    with open(restored._get_user_filepath("a"), "rb") as f:
+        saved = pickle.load(f)
+    assert len(saved["encodings"]) == 3
+    assert saved["metadata"]["scope"] == "new"
+    # The copy handed to the thread was not affected by the in-place update
+    assert len(writes[users.index("a")][2]["encodings"]) == 2
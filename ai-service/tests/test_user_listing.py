@@ -0,0 +1,147 @@
+"""Indexed, paginated and streamed enrolled-user listing (/api/users)"""
+
+import itertools
+import json
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import face_routes
+from app.main import app
+
+SCOPES = ["north", "south", "east"]
+BASE_TIME = datetime(2026, 1, 1)
+
+
+@pytest.fixture
+def client(service, monkeypatch):
+    """API client backed by a service with 300 users of mixed scope, count and age"""
+    rng = random.Random(7)
+    for i in range(300):
+        user_id = f"user{i:04d}"
+        count = rng.randint(1, 5)
+        metadata = {
+            "created_at": BASE_TIME.isoformat(),
+            "updated_at": (BASE_TIME + timedelta(minutes=rng.randint(0, 5000))).isoformat(),
+            "encoding_count": count,
+        }
+        if i % 5:
+            metadata["scope"] = rng.choice(SCOPES)
+        service._encodings_cache[user_id] = [np.zeros(128) for _ in range(count)]
+        service._user_metadata[user_id] = metadata
+        service._record_change(user_id)
+
+    monkeypatch.setattr(face_routes, "face_service", service)
+    return TestClient(app)
+
+
+def brute_force(service, updated_since=None, scope=None, min_encodings=0):
+    users = [
+        {"user_id": user_id, "embedding_count": len(service._encodings_cache[user_id]), **metadata}
+        for user_id, metadata in service._user_metadata.items()
+    ]
+    users = [
+        user for user in users
+        if (scope is None or user.get("scope") == scope)
+        and user["embedding_count"] >= min_encodings
+        and (updated_since is None or user["updated_at"] >= updated_since)
+    ]
+    if updated_since is None:
+        return sorted(users, key=lambda user: user["user_id"])
+    return sorted(users, key=lambda user: (user["updated_at"], user["user_id"]))
+
+
+def fetch_all(client, **params):
+    users, cursor, pages = [], None, 0
+    while True:
+        query = {**params, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/users", params=query)
+        assert response.status_code == 200
+        page = response.json()
+        assert page["count"] == len(page["users"])
+        users += page["users"]
+        pages += 1
+        cursor = page["next_cursor"]
+        if not cursor:
+            return users, pages
+
+
+FILTERS = list(itertools.product(
+    [None, "2026-01-03T00:00:00"],  # updated_since
+    [None, "south"],                # scope
+    [0, 3],                         # min_encodings
+))
+
+
+@pytest.mark.parametrize("updated_since,scope,min_encodings", FILTERS)
+def test_paging_to_exhaustion_matches_brute_force(client, service, updated_since, scope, min_encodings):
+    params = {"limit": 17, "min_encodings": min_encodings}
+    if updated_since:
+        params["updated_since"] = updated_since
+    if scope:
+        params["scope"] = scope
+
+    users, pages = fetch_all(client, **params)
+    expected = brute_force(service, updated_since, scope, min_encodings)
+
+    assert users == expected
+    assert pages == max(1, -(-len(expected) // 17))
+
+
+def test_unpaged_listing_returns_everyone(client, service):
+    page = client.get("/api/users").json()
+
+    assert page["users"] == brute_force(service)
+    assert page["count"] == 300 and page["next_cursor"] is None
+
+
+def test_changed_users_move_to_the_end_of_the_updated_order(client, service):
+    service._user_metadata["user0001"]["updated_at"] = "2030-01-01T00:00:00"
+    service._record_change("user0001")
+    service._remove_user("user0002")
+
+    changed = client.get("/api/users", params={"updated_since": "2029-01-01"}).json()["users"]
+    everyone, _ = fetch_all(client, limit=50)
+
+    assert [user["user_id"] for user in changed] == ["user0001"]
+    assert "user0002" not in {user["user_id"] for user in everyone}
+
+
+@pytest.mark.parametrize("params", [
+    {"cursor": "not-base64!"},
+    {"updated_since": "yesterday"},
+    {"format": "xml"},
+])
+def test_invalid_parameters_are_rejected(client, params):
+    assert client.get("/api/users", params=params).status_code == 400
+
+
+def test_cursor_from_another_ordering_is_rejected(client):
+    by_id = client.get("/api/users", params={"limit": 5}).json()["next_cursor"]
+    by_updated = client.get(
+        "/api/users", params={"limit": 5, "updated_since": "2026-01-01"},
+    ).json()["next_cursor"]
+
+    assert client.get("/api/users", params={"cursor": by_id, "updated_since": "2026-01-01"}).status_code == 400
+    assert client.get("/api/users", params={"cursor": by_updated}).status_code == 400
+
+
+@pytest.mark.parametrize("headers,params", [
+    ({}, {"format": "ndjson"}),
+    ({"Accept": "application/x-ndjson"}, {}),
+])
+def test_ndjson_pages_carry_next_cursor_header(client, service, headers, params):
+    users, cursor = [], None
+    while True:
+        query = {**params, "limit": 120, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/users", params=query, headers=headers)
+        assert response.headers["content-type"] == "application/x-ndjson"
+        users += [json.loads(line) for line in response.text.splitlines()]
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+
+    assert users == brute_force(service)